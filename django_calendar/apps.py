@@ -5,3 +5,6 @@ class DCalendarConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_calendar'
     label = 'calendar'
+
+    def ready(self):
+        from django_calendar import signals  # noqa: F401
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from django_calendar import instrumentation
+from django_calendar.conf import (
+    get_result_cache_alias, get_result_cache_max_windows, get_result_cache_timeout, get_rule_cache_size,
+)
+
+
+class RuleCache:
+    """ Cache LRU, local ao processo, das regras do dateutil já compiladas.
+        As chaves começam pelo pk da RecurrencyRule, o que permite invalidar as entradas de uma regra.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rules = OrderedDict()
+        self._lock = Lock()
+
+    def get_maxsize(self):
+        return get_rule_cache_size() if self.maxsize is None else self.maxsize
+
+    def get(self, key, factory):
+        maxsize = self.get_maxsize()
+        if not maxsize:
+            return factory()
+        with self._lock:
+            if key in self._rules:
+                self.hits += 1
+                instrumentation.add('rule_cache_hits')
+                self._rules.move_to_end(key)
+                return self._rules[key]
+            self.misses += 1
+        rule = factory()
+        with self._lock:
+            self._rules[key] = rule
+            while len(self._rules) > maxsize:
+                self._rules.popitem(last=False)
+        return rule
+
+    def invalidate(self, *pks):
+        pks = set(pks)
+        with self._lock:
+            for key in [key for key in self._rules if key[0] in pks]:
+                del self._rules[key]
+
+    def clear(self):
+        with self._lock:
+            self._rules.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._rules), 'maxsize': self.get_maxsize()}
+
+
+rule_cache = RuleCache()
+
+
+class ResultCache:
+    """ Resultados de listagens de eventos guardados no cache do Django indicado em CALENDAR_RESULT_CACHE.
+        As chaves incluem a versão do calendário, então uma alteração em qualquer evento, regra ou data
+        excluída dele faz as listagens seguintes serem recalculadas. Cada calendário mantém um índice com
+        as chaves dos seus períodos, usado para descartá-los quando ele muda e para guardar no máximo
+        CALENDAR_RESULT_CACHE_MAX_WINDOWS períodos.
+    """
+
+    prefix = 'django_calendar'
+    lock_timeout = 30
+    poll_interval = 0.05
+
+    def is_enabled(self):
+        return get_result_cache_alias() is not None
+
+    def get_cache(self):
+        return caches[get_result_cache_alias()]
+
+    def make_key(self, key):
+        return ':'.join(str(part) for part in (self.prefix, *key))
+
+    def get_index_key(self, pk):
+        return self.make_key((pk, 'windows'))
+
+    def get(self, key, factory):
+        """ Devolve o resultado guardado em `key`, cujo primeiro item é o pk do calendário, ou o calcula com
+            `factory`. Enquanto um processo calcula uma chave, os demais esperam pelo resultado dele em vez de
+            também recalculá-la. Se ele falhar, liberando a trava sem guardar o resultado, o primeiro que a
+            obtiver calcula; se ele não terminar em `lock_timeout` segundos, calculam por conta própria.
+        """
+        cache = self.get_cache()
+        cache_key = self.make_key(key)
+        result = cache.get(cache_key)
+        if result is not None:
+            instrumentation.add('result_cache_hits')
+            return result
+
+        lock_key = cache_key + ':lock'
+        if not cache.add(lock_key, True, self.lock_timeout):
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                result = cache.get(cache_key)
+                if result is not None:
+                    return result
+                if cache.add(lock_key, True, self.lock_timeout):
+                    break
+        try:
+            result = factory()
+            cache.set(cache_key, result, get_result_cache_timeout())
+            self.add_window(key[0], cache_key)
+        finally:
+            cache.delete(lock_key)
+        return result
+
+    async def aget(self, key, factory):
+        """ Como get, pela API assíncrona do cache, para `factory` que devolve uma corrotina. """
+        cache = self.get_cache()
+        cache_key = self.make_key(key)
+        result = await cache.aget(cache_key)
+        if result is not None:
+            instrumentation.add('result_cache_hits')
+            return result
+
+        lock_key = cache_key + ':lock'
+        if not await cache.aadd(lock_key, True, self.lock_timeout):
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                result = await cache.aget(cache_key)
+                if result is not None:
+                    return result
+                if await cache.aadd(lock_key, True, self.lock_timeout):
+                    break
+        try:
+            result = await factory()
+            await cache.aset(cache_key, result, get_result_cache_timeout())
+            await sync_to_async(self.add_window)(key[0], cache_key)
+        finally:
+            await cache.adelete(lock_key)
+        return result
+
+    def add_window(self, pk, cache_key):
+        cache = self.get_cache()
+        index_key = self.get_index_key(pk)
+        windows = [window for window in cache.get(index_key, []) if window != cache_key] + [cache_key]
+        max_windows = get_result_cache_max_windows()
+        if len(windows) > max_windows:
+            cache.delete_many(windows[:-max_windows])
+            windows = windows[-max_windows:]
+        cache.set(index_key, windows, get_result_cache_timeout())
+
+    def invalidate(self, *pks):
+        """ Descarta todos os períodos guardados dos calendários. """
+        if not self.is_enabled():
+            return
+        cache = self.get_cache()
+        index_keys = [self.get_index_key(pk) for pk in pks]
+        windows = cache.get_many(index_keys)
+        cache.delete_many([window for keys in windows.values() for window in keys] + index_keys)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,41 @@
+from django.conf import settings
+
+
+def get_occurrences_enabled():
+    return getattr(settings, 'CALENDAR_OCCURRENCES', False)
+
+
+def get_occurrences_horizon():
+    return getattr(settings, 'CALENDAR_OCCURRENCES_HORIZON', 548)
+
+
+def get_rule_cache_size():
+    return getattr(settings, 'CALENDAR_RULE_CACHE_SIZE', 1024)
+
+
+def get_parallel_threshold():
+    return getattr(settings, 'CALENDAR_PARALLEL_THRESHOLD', 1000)
+
+
+def get_parallel_chunk_size():
+    return getattr(settings, 'CALENDAR_PARALLEL_CHUNK_SIZE', 250)
+
+
+def get_result_cache_alias():
+    return getattr(settings, 'CALENDAR_RESULT_CACHE', None)
+
+
+def get_result_cache_timeout():
+    return getattr(settings, 'CALENDAR_RESULT_CACHE_TIMEOUT', 300)
+
+
+def get_result_cache_max_windows():
+    return getattr(settings, 'CALENDAR_RESULT_CACHE_MAX_WINDOWS', 32)
+
+
+def get_instrumentation_enabled():
+    return getattr(settings, 'CALENDAR_INSTRUMENTATION', False)
+
+
+def get_instrumentation_callback():
+    return getattr(settings, 'CALENDAR_INSTRUMENTATION_CALLBACK', None)
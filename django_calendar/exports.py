@@ -0,0 +1,79 @@
+from datetime import timezone
+
+from django_calendar.models import Event
+
+
+def escape_ics_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def format_ics_datetime(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_ics_local_datetime(name, value, zone):
+    """ Propriedade com o horário local no fuso `zone`, como DTSTART;TZID=America/Sao_Paulo:20240901T100000. """
+    return '{};TZID={}:{}'.format(name, zone.key, value.astimezone(zone).strftime('%Y%m%dT%H%M%S'))
+
+
+def fold_ics_line(line):
+    """ Dobra a linha em partes de até 75 octetos (RFC 5545, 3.1), sem quebrar caracteres UTF-8. """
+    parts = []
+    part = ''
+    for char in line:
+        if len((part + char).encode('utf-8')) > (75 if not parts else 74):
+            parts.append(part)
+            part = ''
+        part += char
+    parts.append(part)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def iter_vevent_lines(event):
+    """ Linhas do VEVENT. Eventos recorrentes levam DTSTART, DTEND e EXDATE no fuso do evento, com TZID, para
+        que quem assina o calendário expanda a regra no mesmo horário local através do horário de verão;
+        os demais saem em UTC. Os TZIDs são nomes da IANA, sem VTIMEZONE (RFC 7809).
+    """
+    rule = getattr(event, 'rrule', None)
+    zone = None if rule is None else event.get_zone()
+    yield 'BEGIN:VEVENT'
+    yield 'UID:{}'.format(event.uid)
+    yield 'DTSTAMP:{}'.format(format_ics_datetime(event.modified))
+    if zone is None:
+        yield 'DTSTART:{}'.format(format_ics_datetime(event.dtstart))
+        yield 'DTEND:{}'.format(format_ics_datetime(event.dtend))
+    else:
+        yield format_ics_local_datetime('DTSTART', event.dtstart, zone)
+        yield format_ics_local_datetime('DTEND', event.dtend, zone)
+    yield 'SUMMARY:{}'.format(escape_ics_text(event.summary))
+    if event.description:
+        yield 'DESCRIPTION:{}'.format(escape_ics_text(event.description))
+    yield 'STATUS:{}'.format(event.status)
+    yield 'SEQUENCE:{}'.format(event.sequence)
+    if rule is not None:
+        yield rule.get_rule_text()
+        exdates = [exdate.exdate.astimezone(zone).strftime('%Y%m%dT%H%M%S') for exdate in event.exdate.all()]
+        if exdates:
+            yield 'EXDATE;TZID={}:{}'.format(zone.key, ','.join(exdates))
+    yield 'END:VEVENT'
+
+
+def iter_ics(calendar, chunk_size=500):
+    """ Serializa o calendário como VCALENDAR, uma linha por vez, para uso com StreamingHttpResponse.
+        Os eventos são lidos em blocos de `chunk_size` e as regras saem como RRULE, sem expandir ocorrências.
+    """
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield 'PRODID:-//django-calendar//EN\r\n'
+    yield fold_ics_line('X-WR-CALNAME:{}'.format(escape_ics_text(calendar.summary)))
+    events = (
+        Event.objects.filter(calendar=calendar)
+        .select_related('rrule')
+        .prefetch_related('exdate')
+        .order_by('pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    for event in events:
+        event.calendar = calendar
+        yield ''.join(fold_ics_line(line) for line in iter_vevent_lines(event))
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,256 @@
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.utils.timezone import make_aware, now
+
+from django_calendar.cache import rule_cache
+from django_calendar.models import Calendar, Event, ExDate, RecurrencyRule
+from django_calendar.occurrences import materialize_events
+from django_calendar.zones import get_zone
+
+
+EVENT_FIELDS = ['uid', 'summary', 'description', 'dtstart', 'dtend', 'status', 'sequence', 'tzid']
+
+
+def build_event(calendar, row):
+    if not row.get('summary') or not row.get('dtstart') or not row.get('dtend'):
+        raise ValueError('summary, dtstart e dtend são obrigatórios.')
+    if row.get('tzid'):
+        get_zone(row['tzid'])
+    event = Event(calendar=calendar, **{field: row[field] for field in EVENT_FIELDS if row.get(field) is not None})
+    rule = RecurrencyRule.objects.build_by_rrule(event, row['rrule']) if row.get('rrule') else None
+    exdates = [ExDate(event=event, exdate=exdate) for exdate in row.get('exdate', [])]
+    return event, rule, exdates
+
+
+def import_events(calendar, rows, batch_size=500):
+    """ Importa eventos no calendário com bulk_create, em lotes, dentro de uma transação.
+
+        Cada linha é um dicionário com os campos do Event e, opcionalmente, 'rrule' (o texto da regra, como
+        em create_by_rrule) e 'exdate' (lista de datetimes). Linhas inválidas não interrompem a importação.
+        As ocorrências dos eventos criados são geradas em um único passo no final.
+        Devolve os eventos criados e as linhas rejeitadas, como (índice, linha, erro).
+    """
+    created = []
+    rejected = []
+    rows = enumerate(rows)
+    with transaction.atomic():
+        while batch := list(islice(rows, batch_size)):
+            events, rules, exdates = [], [], []
+            for index, row in batch:
+                try:
+                    event, rule, event_exdates = build_event(calendar, row)
+                except (KeyError, ValueError, TypeError) as error:
+                    rejected.append((index, row, error))
+                    continue
+                events.append(event)
+                rules += [rule] if rule else []
+                exdates += event_exdates
+            Event.objects.bulk_create(events)
+            RecurrencyRule.objects.bulk_create(rules)
+            ExDate.objects.bulk_create(exdates)
+            created += events
+        materialize_events(calendar, [event.pk for event in created])
+        if created:
+            Calendar.objects.bump_version(pk=calendar.pk)
+    return created, rejected
+
+
+def iter_ics_lines(stream):
+    """ Linhas de um arquivo iCalendar, já desdobradas (RFC 5545, 3.1), lidas sob demanda do stream. """
+    line = None
+    for raw in stream:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and line is not None:
+            line += raw[1:]
+            continue
+        if line:
+            yield line
+        line = raw
+    if line:
+        yield line
+
+
+def parse_ics_line(line):
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            break
+    else:
+        raise ValueError('Linha inválida: {}'.format(line))
+    name, *params = line[:index].split(';')
+    params = dict(param.split('=', 1) for param in params if '=' in param)
+    return name.upper(), {key.upper(): value.strip('"') for key, value in params.items()}, line[index + 1:]
+
+
+def iter_vevents(stream):
+    """ Componentes VEVENT do stream, um de cada vez, como dicionários de propriedade para a lista de
+        (parâmetros, valor). Componentes aninhados, como VALARM, são ignorados. Linhas malformadas fora de um
+        VEVENT são ignoradas; dentro de um, ficam sob a chave None, e parse_vevent rejeita o componente.
+    """
+    component = None
+    depth = 0
+    for line in iter_ics_lines(stream):
+        try:
+            name, params, value = parse_ics_line(line)
+        except ValueError:
+            if component is not None and not depth:
+                component.setdefault(None, []).append(({}, line))
+            continue
+        if name == 'BEGIN':
+            if component is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                component = {}
+        elif name == 'END' and component is not None:
+            if depth:
+                depth -= 1
+            elif value.upper() == 'VEVENT':
+                yield component
+                component = None
+        elif component is not None and not depth:
+            component.setdefault(name, []).append((params, value))
+
+
+def unescape_ics_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def parse_ics_datetime(params, value):
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return make_aware(datetime.strptime(value, '%Y%m%d'))
+    if value.endswith('Z'):
+        return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+    if 'TZID' in params:
+        return datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=ZoneInfo(params['TZID']))
+    return make_aware(datetime.strptime(value, '%Y%m%dT%H%M%S'))
+
+
+def parse_ics_uid(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, value)
+
+
+def parse_vevent(component):
+    """ Converte um VEVENT na linha esperada por import_events. UIDs que não são UUID viram um uuid5 estável e o
+        TZID do DTSTART, se houver, vira o fuso do evento, onde a regra é expandida.
+    """
+    if None in component:
+        raise ValueError('Linha inválida: {}'.format(component[None][0][1]))
+    if 'RECURRENCE-ID' in component:
+        raise ValueError('Exceções com RECURRENCE-ID não são suportadas.')
+    dtstart_params, dtstart = component['DTSTART'][0]
+    dtstart = parse_ics_datetime(dtstart_params, dtstart)
+    if 'DTEND' in component:
+        dtend = parse_ics_datetime(*component['DTEND'][0])
+    elif dtstart_params.get('VALUE') == 'DATE':
+        dtend = dtstart + timedelta(days=1)
+    else:
+        dtend = dtstart
+    row = {
+        'uid': parse_ics_uid(component['UID'][0][1]),
+        'summary': unescape_ics_text(component.get('SUMMARY', [({}, '')])[0][1]),
+        'dtstart': dtstart,
+        'dtend': dtend,
+        'sequence': int(component.get('SEQUENCE', [({}, 0)])[0][1]),
+        'exdate': [
+            parse_ics_datetime(params, exdate)
+            for params, value in component.get('EXDATE', [])
+            for exdate in value.split(',')
+        ],
+    }
+    if 'TZID' in dtstart_params:
+        row['tzid'] = dtstart_params['TZID']
+    if 'DESCRIPTION' in component:
+        row['description'] = unescape_ics_text(component['DESCRIPTION'][0][1])
+    status = component.get('STATUS', [({}, '')])[0][1].upper()
+    if status in ['TENTATIVE', 'CONFIRMED', 'CANCELLED']:
+        row['status'] = status
+    if 'RRULE' in component:
+        row['rrule'] = component['RRULE'][0][1]
+    return row
+
+
+def update_events(calendar, changed):
+    """ Atualiza eventos existentes a partir de pares (evento, linha), trocando regra e datas excluídas.
+        Devolve os eventos atualizados e as linhas rejeitadas, como (índice, linha, erro).
+    """
+    events, rules, exdates = [], [], []
+    rejected = []
+    for index, (event, row) in enumerate(changed):
+        try:
+            obj, rule, event_exdates = build_event(calendar, row)
+        except (KeyError, ValueError, TypeError) as error:
+            rejected.append((index, row, error))
+            continue
+        obj.pk = event.pk
+        obj.modified = now()
+        events.append(obj)
+        rules += [rule] if rule else []
+        exdates += event_exdates
+    Event.objects.bulk_update(events, [field for field in EVENT_FIELDS if field != 'uid'] + ['modified'])
+    # Sem sinais: a regeneração das ocorrências e o incremento da versão são feitos uma vez, abaixo.
+    old_rules = RecurrencyRule.objects.filter(event__in=events)
+    rule_cache.invalidate(*old_rules.values_list('pk', flat=True))
+    old_rules._raw_delete(old_rules.db)
+    old_exdates = ExDate.objects.filter(event__in=events)
+    old_exdates._raw_delete(old_exdates.db)
+    RecurrencyRule.objects.bulk_create(rules)
+    ExDate.objects.bulk_create(exdates)
+    materialize_events(calendar, [event.pk for event in events])
+    if events:
+        Calendar.objects.bump_version(pk=calendar.pk)
+    return events, rejected
+
+
+def import_ics(calendar, stream, batch_size=500):
+    """ Importa os VEVENTs de um stream iCalendar no calendário, lendo e gravando em lotes de `batch_size`,
+        com memória constante. Eventos já existentes (mesmo calendário e uid) só são atualizados quando o
+        SEQUENCE é maior que o gravado. Devolve as quantidades criadas, atualizadas e ignoradas e as
+        linhas rejeitadas, como (índice do VEVENT, VEVENT, erro).
+    """
+    result = {'created': 0, 'updated': 0, 'skipped': 0, 'rejected': []}
+    vevents = enumerate(iter_vevents(stream))
+    with transaction.atomic():
+        while batch := list(islice(vevents, batch_size)):
+            rows = {}
+            for index, component in batch:
+                try:
+                    row = parse_vevent(component)
+                except (KeyError, ValueError) as error:
+                    result['rejected'].append((index, component, error))
+                    continue
+                if row['uid'] in rows and rows[row['uid']][1]['sequence'] >= row['sequence']:
+                    result['skipped'] += 1
+                    continue
+                result['skipped'] += row['uid'] in rows
+                rows[row['uid']] = (index, row)
+
+            existing = Event.objects.filter(calendar=calendar, uid__in=rows).only('uid', 'sequence')
+            existing = {event.uid: event for event in existing}
+            new, changed = [], []
+            for uid, (index, row) in rows.items():
+                if uid not in existing:
+                    new.append((index, row))
+                elif row['sequence'] > existing[uid].sequence:
+                    changed.append((index, existing[uid], row))
+                else:
+                    result['skipped'] += 1
+
+            created, rejected = import_events(calendar, [row for index, row in new], batch_size)
+            result['created'] += len(created)
+            result['rejected'] += [(new[index][0], row, error) for index, row, error in rejected]
+            updated, rejected = update_events(calendar, [(event, row) for index, event, row in changed])
+            result['updated'] += len(updated)
+            result['rejected'] += [(changed[index][0], row, error) for index, row, error in rejected]
+    return result
@@ -0,0 +1,112 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+
+from django_calendar.conf import get_instrumentation_callback, get_instrumentation_enabled
+
+
+span_finished = Signal()
+
+current_span = ContextVar('django_calendar_span', default=None)
+
+
+class Span:
+    """ Medições de uma chamada instrumentada: consultas, tempo por fase e contadores (eventos lidos,
+        ocorrências geradas, regras compiladas e encontradas no cache). O tempo de 'expand' é o total menos
+        o gasto em SQL e na compilação de regras.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.phases = {'sql': 0.0, 'parse': 0.0}
+        self.counters = {}
+        self.elapsed = 0.0
+
+    def add(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.phases['sql'] += time.perf_counter() - started
+
+    def as_dict(self):
+        phases = dict(self.phases, expand=max(0.0, self.elapsed - self.phases['sql'] - self.phases['parse']))
+        return {
+            'name': self.name,
+            'elapsed': self.elapsed,
+            'queries': self.queries,
+            'phases': phases,
+            'counters': dict(self.counters),
+        }
+
+
+def is_enabled():
+    return get_instrumentation_enabled() or get_instrumentation_callback() is not None
+
+
+@contextmanager
+def span(name):
+    """ Mede o bloco, a menos que a instrumentação esteja desligada ou já haja uma medição em andamento,
+        que passa a incluir o bloco. Ao final, envia o sinal span_finished e chama
+        CALENDAR_INSTRUMENTATION_CALLBACK, se configurado, com o dicionário da medição.
+    """
+    if current_span.get() is not None or not is_enabled():
+        yield current_span.get()
+        return
+    measured = Span(name)
+    token = current_span.set(measured)
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(measured.execute_wrapper))
+            yield measured
+    finally:
+        measured.elapsed = time.perf_counter() - started
+        current_span.reset(token)
+        span_finished.send(sender=Span, span=measured)
+        callback = get_instrumentation_callback()
+        if callback is not None:
+            import_string(callback)(measured.as_dict())
+
+
+def instrumented(name):
+    """ Decorador que mede cada chamada da função com span(name). """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is not None or not is_enabled():
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add(counter, value=1):
+    """ Soma `value` ao contador da medição em andamento, se houver. """
+    measured = current_span.get()
+    if measured is not None:
+        measured.add(counter, value)
+
+
+def timed(phase, function):
+    """ Chama `function`, somando o tempo gasto à fase da medição em andamento, se houver. """
+    measured = current_span.get()
+    if measured is None:
+        return function()
+    started = time.perf_counter()
+    try:
+        return function()
+    finally:
+        measured.phases[phase] += time.perf_counter() - started
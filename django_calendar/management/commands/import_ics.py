@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_calendar.imports import import_ics
+from django_calendar.models import Calendar
+
+
+class Command(BaseCommand):
+    help = 'Importa os eventos de um arquivo iCalendar (.ics) em um calendário.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('calendar', help='uid do calendário.')
+        parser.add_argument('path', help='Caminho do arquivo .ics, ou "-" para a entrada padrão.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        calendar = Calendar.objects.filter(uid=options['calendar']).first()
+        if calendar is None:
+            raise CommandError('Calendário não encontrado: {}'.format(options['calendar']))
+        if options['path'] == '-':
+            result = import_ics(calendar, sys.stdin, options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as stream:
+                result = import_ics(calendar, stream, options['batch_size'])
+        for index, component, error in result['rejected']:
+            self.stderr.write('VEVENT {} rejeitado: {}'.format(index, error))
+        self.stdout.write('{created} criados, {updated} atualizados, {skipped} ignorados'.format(**result))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from django_calendar.conf import get_occurrences_enabled, get_occurrences_horizon
+from django_calendar.models import Calendar
+from django_calendar.occurrences import materialize_calendar
+
+
+class Command(BaseCommand):
+    help = 'Gera ou estende a tabela de ocorrências de cada calendário até o horizonte configurado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=None, help='Horizonte em dias a partir de hoje.')
+
+    def handle(self, *args, **options):
+        if not get_occurrences_enabled():
+            raise CommandError('A tabela de ocorrências está desativada (CALENDAR_OCCURRENCES).')
+        horizon = options['horizon'] or get_occurrences_horizon()
+        end = localdate() + timedelta(days=horizon)
+        for calendar in Calendar.objects.all():
+            total = materialize_calendar(calendar, end)
+            self.stdout.write('{}: {} ocorrências geradas até {}'.format(calendar, total, end))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:11
+
+import django.db.models.deletion
+import django_calendar.models.managers
+import django_calendar.models.mixins
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar', '0006_event_indexes'),
+        ('sites', '0002_alter_domain_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='occurrences_end',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='ocorrências geradas até'),
+        ),
+        migrations.AddField(
+            model_name='calendar',
+            name='occurrences_start',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='ocorrências geradas a partir de'),
+        ),
+        migrations.CreateModel(
+            name='Occurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='dia')),
+                ('dtstart', models.DateTimeField(verbose_name='data e hora inicial')),
+                ('dtend', models.DateTimeField(verbose_name='data e hora final')),
+                ('status', models.CharField(max_length=12, verbose_name='situação')),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calendar.calendar', verbose_name='calendário')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='calendar.event', verbose_name='evento')),
+                ('site', models.ForeignKey(default=django_calendar.models.mixins.get_site_id, editable=False, on_delete=django.db.models.deletion.PROTECT, to='sites.site', verbose_name='site')),
+            ],
+            options={
+                'verbose_name': 'ocorrência',
+                'verbose_name_plural': 'ocorrências',
+                'indexes': [models.Index(fields=['calendar', 'day'], name='calendar_oc_calenda_40d583_idx')],
+            },
+            managers=[
+                ('objects', django_calendar.models.managers.OccurrenceManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:23
+
+import django_calendar.models.managers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar', '0008_event_uid_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='calendar',
+            managers=[
+                ('objects', django_calendar.models.managers.CalendarManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='calendar',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='versão'),
+        ),
+    ]
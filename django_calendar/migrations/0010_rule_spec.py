@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+from collections import deque
+from datetime import timezone
+
+from dateutil import rrule
+from django.db import migrations, models
+
+
+def get_values(value):
+    return value.split(',') if isinstance(value, str) else value
+
+
+def get_rule_string(rule):
+    """ Texto da regra como RecurrencyRule.get_rule_string o gerava nesta migração, a partir dos campos do
+        modelo histórico.
+    """
+    rule_string = 'RRULE:FREQ={};INTERVAL={}'.format(
+        {'MONTHDAY': 'MONTHLY', 'YEARDAY': 'YEARLY'}.get(rule.freq, rule.freq), rule.interval,
+    )
+    parts = {
+        'WEEKLY': [('BYDAY', rule.byday)],
+        'MONTHLY': [('BYMONTHDAY', rule.bymonthdate)],
+        'MONTHDAY': [('BYDAY', rule.bymonthday)],
+        'YEARLY': [('BYMONTH', rule.bymonth), ('BYMONTHDAY', rule.bymonthdate)],
+        'YEARDAY': [('BYMONTH', rule.bymonth), ('BYDAY', rule.bymonthday)],
+    }
+    for name, value in parts.get(rule.freq, []):
+        if value:
+            rule_string += ';{}={}'.format(name, ','.join(get_values(value)))
+    if rule.repeat == 'UNTIL':
+        rule_string += ';UNTIL={}'.format(rule.until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+    elif rule.repeat == 'COUNT':
+        rule_string += ';COUNT={}'.format(rule.count)
+    return rule_string
+
+
+def get_bounds(rule_string, repeat, dtstart):
+    """ Início da primeira e da última ocorrência (None para regras sem fim) de uma regra para um evento que
+        começa em dtstart, expandida pelo dateutil.
+    """
+    base = dtstart.replace(hour=0, minute=0)
+    datetimes = rrule.rrulestr(rule_string, dtstart=base)
+    first = datetimes.after(base, inc=True)
+    last = None if repeat is None else next(iter(deque(datetimes, maxlen=1)), None)
+    return tuple(
+        None if data is None else dtstart.replace(year=data.year, month=data.month, day=data.day)
+        for data in (first, last)
+    )
+
+
+def backfill_rule_spec(apps, schema_editor):
+    """ Calcula o texto e os limites das regras existentes. As funções acima são cópias congeladas das do
+        modelo, para que a migração não dependa dos campos e métodos atuais.
+    """
+    RecurrencyRule = apps.get_model('calendar', 'RecurrencyRule')
+    rules = []
+    for rule in RecurrencyRule.objects.select_related('event').iterator(chunk_size=500):
+        rule.rule_text = get_rule_string(rule)
+        rule.first_occurrence, rule.last_occurrence = get_bounds(rule.rule_text, rule.repeat, rule.event.dtstart)
+        rules.append(rule)
+    RecurrencyRule.objects.bulk_update(rules, ['rule_text', 'first_occurrence', 'last_occurrence'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar', '0009_calendar_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurrencyrule',
+            name='first_occurrence',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='primeira ocorrência'),
+        ),
+        migrations.AddField(
+            model_name='recurrencyrule',
+            name='last_occurrence',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Vazio para regras sem fim.', null=True, verbose_name='última ocorrência'),
+        ),
+        migrations.AddField(
+            model_name='recurrencyrule',
+            name='rule_text',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='regra'),
+        ),
+        migrations.RunPython(backfill_rule_spec, migrations.RunPython.noop),
+    ]
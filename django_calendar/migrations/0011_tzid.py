@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from collections import deque
+from zoneinfo import ZoneInfo
+
+import django_calendar.zones
+from dateutil import rrule
+from django.db import migrations, models
+from django.utils.timezone import get_default_timezone
+
+
+def get_bounds(rule_string, repeat, dtstart):
+    """ Início da primeira e da última ocorrência (None para regras sem fim) de uma regra para um evento que
+        começa em dtstart, expandida pelo dateutil.
+    """
+    base = dtstart.replace(hour=0, minute=0)
+    datetimes = rrule.rrulestr(rule_string, dtstart=base)
+    first = datetimes.after(base, inc=True)
+    last = None if repeat is None else next(iter(deque(datetimes, maxlen=1)), None)
+    return tuple(
+        None if data is None else dtstart.replace(year=data.year, month=data.month, day=data.day)
+        for data in (first, last)
+    )
+
+
+def expand_in_event_zone(apps, schema_editor):
+    """ As ocorrências passam a ser calculadas no fuso de cada evento: recalcula os limites das regras, a
+        partir do texto gravado em 0010, e descarta as ocorrências materializadas, geradas sobre o dia UTC.
+        Os calendários voltam a ser expandidos sob demanda até a próxima execução de materialize_occurrences.
+    """
+    RecurrencyRule = apps.get_model('calendar', 'RecurrencyRule')
+    rules = []
+    for rule in RecurrencyRule.objects.select_related('event__calendar').iterator(chunk_size=500):
+        tzid = rule.event.tzid or rule.event.calendar.tzid
+        dtstart = rule.event.dtstart.astimezone(ZoneInfo(tzid) if tzid else get_default_timezone())
+        rule.first_occurrence, rule.last_occurrence = get_bounds(rule.rule_text, rule.repeat, dtstart)
+        rules.append(rule)
+    RecurrencyRule.objects.bulk_update(rules, ['first_occurrence', 'last_occurrence'], batch_size=500)
+
+    apps.get_model('calendar', 'Occurrence').objects.all().delete()
+    apps.get_model('calendar', 'Calendar').objects.update(occurrences_start=None, occurrences_end=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar', '0010_rule_spec'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='tzid',
+            field=models.CharField(blank=True, help_text='Nome da IANA, como America/Sao_Paulo. Vazio para usar o TIME_ZONE do projeto.', max_length=64, validators=[django_calendar.zones.validate_tzid], verbose_name='fuso horário'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='tzid',
+            field=models.CharField(blank=True, help_text='Vazio para usar o fuso do calendário.', max_length=64, validators=[django_calendar.zones.validate_tzid], verbose_name='fuso horário'),
+        ),
+        migrations.RunPython(expand_in_event_zone, migrations.RunPython.noop),
+    ]
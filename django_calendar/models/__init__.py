@@ -1,26 +1,65 @@
 import uuid
+from bisect import bisect_left, bisect_right
+import itertools
+from collections import deque
+from datetime import date, timedelta, timezone
 
 from dateutil import rrule
+from dateutil.relativedelta import relativedelta
 from django.db import models
+from django.utils.functional import cached_property
+from django.utils.timezone import is_naive, make_aware
 from django.utils.translation import gettext_lazy as _
 from multiselectfield import MultiSelectField
 
-from django_calendar.models.managers import EventManager, RecurrencyRuleManager
+from django_calendar import instrumentation
+from django_calendar.cache import rule_cache
+from django_calendar.conf import get_occurrences_enabled
+from django_calendar.models.managers import CalendarManager, EventManager, OccurrenceManager, RecurrencyRuleManager
 from django_calendar.models.mixins import BaseModel, DescriptionMixin, SiteMixin, SummaryMixin
+from django_calendar.models.values import EventOccurrence
+from django_calendar.zones import get_zone, validate_tzid
 
 
 class Calendar(BaseModel, SummaryMixin):
     uid = models.UUIDField(
         default=uuid.uuid4, unique=True, auto_created=True, editable=False, verbose_name=_('id único'),
     )
+    occurrences_start = models.DateField(
+        null=True, blank=True, editable=False, verbose_name=_('ocorrências geradas a partir de'),
+    )
+    occurrences_end = models.DateField(
+        null=True, blank=True, editable=False, verbose_name=_('ocorrências geradas até'),
+    )
+    version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name=_('versão'))
+    tzid = models.CharField(
+        max_length=64, blank=True, validators=[validate_tzid], verbose_name=_('fuso horário'),
+        help_text=_('Nome da IANA, como America/Sao_Paulo. Vazio para usar o TIME_ZONE do projeto.'),
+    )
+
+    objects = CalendarManager()
 
-    def event_list_by_date(self, date):
+    def has_occurrences(self, start, end):
+        return (
+            get_occurrences_enabled()
+            and self.occurrences_start is not None
+            and self.occurrences_start <= start
+            and end <= self.occurrences_end
+        )
+
+    def event_list_by_date(self, date, version=None, tzinfo=None):
         list_by_date = []
-        events = Event.objects.list_by_date(date, self)
+        events = Event.objects.list_by_date(date, self, version, tzinfo)
         for event in events:
             list_by_date.append((event[0], event[1]))
         return list_by_date
 
+    def event_list_by_range(self, start, end, executor=None, version=None, tzinfo=None):
+        return Event.objects.list_by_range(self, start, end, executor, version, tzinfo)
+
+    def find_conflicts(self, dtstart, dtend, rrule=None, until=None):
+        return Event.objects.find_conflicts(self, dtstart, dtend, rrule, until)
+
     class Meta(BaseModel.BaseMeta):
         verbose_name = _('calandário')
         verbose_name_plural = _('calendários')
@@ -37,21 +76,93 @@ class Event(BaseModel, SummaryMixin, DescriptionMixin):
         ('CANCELLED', _('Cancelado')),
     ])
     sequence = models.PositiveSmallIntegerField(default=0, verbose_name=_('versão'))
+    tzid = models.CharField(
+        max_length=64, blank=True, validators=[validate_tzid], verbose_name=_('fuso horário'),
+        help_text=_('Vazio para usar o fuso do calendário.'),
+    )
 
     objects = EventManager()
 
-    def get_object(self, data):
-        return {
-            'uid': self.uid,
-            'summary': self.summary,
-            'dtstart': self.dtstart.replace(year=data.year, month=data.month, day=data.day),
-            'dtend': self.dtend.replace(year=data.year, month=data.month, day=data.day),
-            'status': self.status,
-        }
+    def get_zone(self):
+        return get_zone(self.tzid or self.calendar.tzid)
+
+    def get_local_dtstart(self):
+        """ dtstart no fuso do evento, onde as regras são expandidas: as ocorrências mantêm o horário local
+            mesmo quando o deslocamento muda com o horário de verão. Datas sem fuso já são horários locais.
+        """
+        return self.dtstart if is_naive(self.dtstart) else self.dtstart.astimezone(self.get_zone())
+
+    def get_object(self, data, dtstart=None):
+        """ Ocorrência no dia `data`, no horário local de `dtstart` (por padrão, get_local_dtstart()), com a
+            duração do evento.
+        """
+        dtstart = (dtstart or self.get_local_dtstart()).replace(year=data.year, month=data.month, day=data.day)
+        return EventOccurrence(self, dtstart, dtstart + (self.dtend - self.dtstart))
+
+    @cached_property
+    def excluded_dates(self):
+        """ Dias das ExDate, ordenados e no fuso do evento, como os dias das ocorrências da regra. """
+        zone = self.get_zone()
+        return sorted({date(d.year, d.month, d.day) for d in (e.exdate.astimezone(zone) for e in self.exdate.all())})
+
+    def is_excluded(self, data):
+        index = bisect_left(self.excluded_dates, data)
+        return index < len(self.excluded_dates) and self.excluded_dates[index] == data
+
+    def get_exdates(self, dtstart, start, end=None):
+        excluded_dates = self.excluded_dates[bisect_left(self.excluded_dates, start):]
+        if end is not None:
+            excluded_dates = excluded_dates[:bisect_right(excluded_dates, end)]
+        return [dtstart.replace(year=d.year, month=d.month, day=d.day) for d in excluded_dates]
+
+    def get_rule_spec(self, start, end, rule):
+        """ Dados serializáveis para expandir a regra do evento entre as datas start e end sem acesso ao banco,
+            no formato esperado por django_calendar.parallel.expand_rule.
+        """
+        dtstart = self.get_local_dtstart().replace(hour=0, minute=0)
+        after = dtstart.replace(year=start.year, month=start.month, day=start.day)
+        return (
+            self.id,
+            rule.get_rule_text(),
+            rule.get_rebased_dtstart(dtstart, after),
+            self.get_exdates(dtstart, start, end),
+            after,
+            dtstart.replace(year=end.year, month=end.month, day=end.day),
+        )
+
+    def iter_occurrences(self, start, end=None, rule=None):
+        """ Ocorrências (data, id, objeto) do evento entre as datas start e end, com as datas e horários no
+            fuso do evento; sem end, a expansão de regras infinitas continua enquanto o gerador for consumido.
+        """
+        local = self.get_local_dtstart()
+        if rule is None:
+            data = date(local.year, local.month, local.day)
+            if start <= data <= end:
+                yield data, self.id, self.get_object(data, local)
+            return
+        dtstart = local.replace(hour=0, minute=0)
+        after = dtstart.replace(year=start.year, month=start.month, day=start.day)
+        if rule.is_simple():
+            for data in rule.iter_dates(dtstart, start, end):
+                if not self.is_excluded(data):
+                    yield data, self.id, self.get_object(data, local)
+            return
+        before = None if end is None else dtstart.replace(year=end.year, month=end.month, day=end.day)
+        exdates = self.get_exdates(dtstart, start, end)
+        for d in rule.get_datetimes(dtstart, after, exdates).xafter(after, inc=True):
+            if before is not None and d > before:
+                return
+            data = date(d.year, d.month, d.day)
+            yield data, self.id, self.get_object(data, local)
 
     class Meta(BaseModel.BaseMeta):
         verbose_name = _('evento')
         verbose_name_plural = _('eventos')
+        indexes = [
+            models.Index(fields=['calendar', 'dtstart']),
+            models.Index(fields=['calendar', 'dtend']),
+            models.Index(fields=['calendar', 'uid']),
+        ]
 
 
 class ExDate(SiteMixin):
@@ -63,6 +174,31 @@ class ExDate(SiteMixin):
         verbose_name_plural = _('datas excluídas')
 
 
+class Occurrence(SiteMixin):
+    event = models.ForeignKey(
+        to='calendar.Event', on_delete=models.CASCADE, related_name='occurrences', verbose_name=_('evento'),
+    )
+    calendar = models.ForeignKey(to='calendar.Calendar', on_delete=models.CASCADE, verbose_name=_('calendário'))
+    day = models.DateField(verbose_name=_('dia'))
+    dtstart = models.DateTimeField(verbose_name=_('data e hora inicial'))
+    dtend = models.DateTimeField(verbose_name=_('data e hora final'))
+    status = models.CharField(max_length=12, verbose_name=_('situação'))
+
+    objects = OccurrenceManager()
+
+    def get_object(self):
+        """ Ocorrência no fuso do evento, como as calculadas sob demanda; o banco devolve o início e o fim em UTC. """
+        zone = self.event.get_zone()
+        return EventOccurrence(self.event, self.dtstart.astimezone(zone), self.dtend.astimezone(zone))
+
+    class Meta:
+        verbose_name = _('ocorrência')
+        verbose_name_plural = _('ocorrências')
+        indexes = [
+            models.Index(fields=['calendar', 'day']),
+        ]
+
+
 class RecurrencyRule(SiteMixin):
     event = models.OneToOneField(
         to='calendar.Event', on_delete=models.CASCADE, related_name='rrule', verbose_name=_('evento'),
@@ -199,12 +335,150 @@ class RecurrencyRule(SiteMixin):
             ('1SA', _('Último Sábado')),
         ], verbose_name=_('dia do mês'),
     )
+    rule_text = models.CharField(max_length=255, blank=True, editable=False, verbose_name=_('regra'))
+    first_occurrence = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name=_('primeira ocorrência'),
+    )
+    last_occurrence = models.DateTimeField(
+        null=True, blank=True, editable=False, db_index=True, verbose_name=_('última ocorrência'),
+        help_text=_('Vazio para regras sem fim.'),
+    )
 
     objects = RecurrencyRuleManager()
 
-    def get_datetimes(self, dtstart):
-        return rrule.rrulestr(self.get_rule_string(), dtstart=dtstart)
-    
+    WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+    def is_simple(self):
+        return self.freq in ['DAILY', 'WEEKLY']
+
+    def get_values(self, field):
+        """ Valores de um campo de seleção múltipla: uma string separada por vírgulas em regras ainda não
+            lidas do banco, como as de build_by_rrule, ou uma lista.
+        """
+        value = getattr(self, field)
+        return value.split(',') if isinstance(value, str) else value
+
+    def get_weekdays(self, first):
+        byday = self.get_values('byday')
+        if self.freq == 'WEEKLY' and byday:
+            return sorted(self.WEEKDAYS.index(day) for day in byday)
+        return [first.weekday()]
+
+    def get_last_date(self, dtstart):
+        """ Último dia possível de ocorrência de uma regra DAILY ou WEEKLY, ou None se a regra é infinita. """
+        first = dtstart.date()
+        match self.repeat:
+            case 'UNTIL':
+                until = self.until.replace(microsecond=0).astimezone(dtstart.tzinfo)
+                last = until.date()
+                if dtstart.replace(year=last.year, month=last.month, day=last.day) > until:
+                    last -= timedelta(days=1)
+                return last
+            case 'COUNT':
+                if self.freq == 'DAILY':
+                    return first + timedelta(days=(self.count - 1) * self.interval)
+                weekdays = self.get_weekdays(first)
+                week = first - timedelta(days=first.weekday())
+                first_week = [day for day in weekdays if day >= first.weekday()]
+                if self.count <= len(first_week):
+                    return week + timedelta(days=first_week[self.count - 1])
+                weeks, index = divmod(self.count - len(first_week) - 1, len(weekdays))
+                return week + timedelta(days=7 * self.interval * (weeks + 1) + weekdays[index])
+        return None
+
+    def has_date(self, dtstart, data):
+        """ Se `data` é um dia de ocorrência da regra; em tempo constante para regras DAILY e WEEKLY. """
+        if not self.is_simple():
+            after = dtstart.replace(year=data.year, month=data.month, day=data.day)
+            d = self.get_datetimes(dtstart, after).after(after, inc=True)
+            return d is not None and d.date() == data
+        first = dtstart.date()
+        last = self.get_last_date(dtstart)
+        if data < first or (last is not None and data > last):
+            return False
+        if self.freq == 'DAILY':
+            return (data - first).days % self.interval == 0
+        weeks = (data - first + timedelta(days=first.weekday() - data.weekday())).days // 7
+        return weeks % self.interval == 0 and data.weekday() in self.get_weekdays(first)
+
+    def iter_dates(self, dtstart, start, end=None):
+        """ Dias de ocorrência de uma regra DAILY ou WEEKLY entre as datas start e end, calculados por
+            aritmética sobre os deslocamentos em dias, sem passar pelo dateutil.
+        """
+        first = dtstart.date()
+        last = self.get_last_date(dtstart)
+        if last is not None and (end is None or last < end):
+            end = last
+        if self.freq == 'DAILY':
+            offset = max(0, -(-(start - first).days // self.interval)) * self.interval
+            if end is None:
+                offsets = itertools.count(offset, self.interval)
+            else:
+                offsets = range(offset, (end - first).days + 1, self.interval)
+            for offset in offsets:
+                yield first + timedelta(days=offset)
+            return
+        weekdays = self.get_weekdays(first)
+        week = first - timedelta(days=first.weekday())
+        for period in itertools.count(max(0, (start - week).days // 7 // self.interval)):
+            for day in weekdays:
+                data = week + timedelta(days=7 * self.interval * period + day)
+                if end is not None and data > end:
+                    return
+                if data >= first and data >= start:
+                    yield data
+
+    def get_datetimes(self, dtstart, after=None, exdates=None):
+        if after is not None:
+            dtstart = self.get_rebased_dtstart(dtstart, after)
+        rule_string = self.get_rule_text()
+
+        def parse():
+            instrumentation.add('rules_parsed')
+            return instrumentation.timed('parse', lambda: rrule.rrulestr(rule_string, dtstart=dtstart))
+
+        if self.pk is None:
+            datetimes = parse()
+        else:
+            datetimes = rule_cache.get((self.pk, rule_string, dtstart), parse)
+        if not exdates:
+            return datetimes
+        ruleset = rrule.rruleset()
+        ruleset.rrule(datetimes)
+        for exdate in exdates:
+            ruleset.exdate(exdate)
+        return ruleset
+
+    def get_rebased_dtstart(self, dtstart, after):
+        """ Avança o dtstart em períodos inteiros da regra para perto de `after`, sem alterar as
+            ocorrências a partir de `after`, para que a expansão não percorra todo o histórico.
+            Regras com COUNT dependem do dtstart original e não são avançadas.
+        """
+        if self.repeat == 'COUNT' or after <= dtstart:
+            return dtstart
+
+        match self.freq:
+            case 'DAILY':
+                elapsed, step = (after - dtstart).days, relativedelta(days=self.interval)
+            case 'WEEKLY':
+                elapsed, step = (after - dtstart).days // 7, relativedelta(weeks=self.interval)
+            case 'MONTHLY' | 'MONTHDAY':
+                elapsed = (after.year - dtstart.year) * 12 + after.month - dtstart.month
+                step = relativedelta(months=self.interval)
+            case _:
+                elapsed, step = after.year - dtstart.year, relativedelta(years=self.interval)
+
+        periods = elapsed // self.interval - 1
+        if periods <= 0:
+            return dtstart
+        if self.freq in ['DAILY', 'WEEKLY']:
+            return dtstart + step * periods
+        if self.bymonthdate or self.bymonthday:
+            return dtstart.replace(day=1) + step * periods
+        if dtstart.day > 28:
+            return dtstart
+        return dtstart + step * periods
+
     def get_rule_string(self):
         rrule = 'RRULE:'
 
@@ -214,34 +488,72 @@ class RecurrencyRule(SiteMixin):
             case 'WEEKLY':
                 rrule += 'FREQ=WEEKLY;INTERVAL={}'.format(self.interval)
                 if self.byday:
-                    rrule += ';BYDAY={}'.format(','.join(self.byday))
+                    rrule += ';BYDAY={}'.format(','.join(self.get_values('byday')))
             case 'MONTHLY':
                 rrule += 'FREQ=MONTHLY;INTERVAL={}'.format(self.interval)
                 if self.bymonthdate:
-                    rrule += ';BYMONTHDAY={}'.format(','.join(self.bymonthdate))
+                    rrule += ';BYMONTHDAY={}'.format(','.join(self.get_values('bymonthdate')))
             case 'MONTHDAY':
                 rrule += 'FREQ=MONTHLY;INTERVAL={}'.format(self.interval)
                 if self.bymonthday:
-                    rrule += ';BYDAY={}'.format(','.join(self.bymonthday))
+                    rrule += ';BYDAY={}'.format(','.join(self.get_values('bymonthday')))
             case 'YEARLY':
-                rrule += 'FREQ=YEARLY;INTERVAL={};BYMONTH={}'.format(self.interval, ','.join(self.bymonth), self.bymonthdate)
+                rrule += 'FREQ=YEARLY;INTERVAL={}'.format(self.interval)
+                if self.bymonth:
+                    rrule += ';BYMONTH={}'.format(','.join(self.get_values('bymonth')))
                 if self.bymonthdate:
-                    rrule += ';BYMONTHDAY={}'.format(','.join(self.bymonthdate))
+                    rrule += ';BYMONTHDAY={}'.format(','.join(self.get_values('bymonthdate')))
             case 'YEARDAY':
-                rrule += 'FREQ=YEARLY;INTERVAL={};BYMONTH={}'.format(self.interval, ','.join(self.bymonth), self.bymonthday)
+                rrule += 'FREQ=YEARLY;INTERVAL={}'.format(self.interval)
+                if self.bymonth:
+                    rrule += ';BYMONTH={}'.format(','.join(self.get_values('bymonth')))
                 if self.bymonthday:
-                    rrule += ';BYDAY={}'.format(','.join(self.bymonthday))
+                    rrule += ';BYDAY={}'.format(','.join(self.get_values('bymonthday')))
 
         match self.repeat:
             case 'UNTIL':
-                rrule += ';UNTIL={}'.format(self.until.isoformat().replace('-', '').replace(':', '')[0:15] + 'Z')
+                rrule += ';UNTIL={}'.format(self.until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
             case 'COUNT':
                 rrule += ';COUNT={}'.format(self.count)
-            case None:
-                rrule += ';COUNT={}'.format(10000)
 
         return rrule
 
+    def get_rule_text(self):
+        return self.rule_text or self.get_rule_string()
+
+    def get_bounds(self, dtstart):
+        """ Início da primeira e da última ocorrência da regra para um evento que começa em dtstart; a última
+            é None para regras sem fim. As datas excluídas não são consideradas.
+        """
+        base = dtstart.replace(hour=0, minute=0)
+        if self.is_simple():
+            first = next(self.iter_dates(base, base.date()), None)
+            last = self.get_last_date(base)
+            if last is not None:
+                last = max(self.iter_dates(base, last - timedelta(weeks=self.interval), last), default=None)
+        else:
+            datetimes = rrule.rrulestr(self.get_rule_string(), dtstart=base)
+            first = datetimes.after(base, inc=True)
+            last = None if self.repeat is None else next(iter(deque(datetimes, maxlen=1)), None)
+        return tuple(
+            None if data is None else dtstart.replace(year=data.year, month=data.month, day=data.day)
+            for data in (first, last)
+        )
+
+    def update_spec(self):
+        """ Grava o texto canônico da regra e as datas da primeira e da última ocorrência do evento, expandida
+            no fuso do evento.
+        """
+        dtstart = self.event.get_local_dtstart()
+        if is_naive(dtstart):
+            dtstart = make_aware(dtstart, self.event.get_zone())
+        self.rule_text = self.get_rule_string()
+        self.first_occurrence, self.last_occurrence = self.get_bounds(dtstart)
+
+    def save(self, *args, **kwargs):
+        self.update_spec()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.event.summary
 
@@ -1,37 +1,437 @@
-from datetime import date
-from functools import cmp_to_key
+import asyncio
+import heapq
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain, islice
 
-from django.core.exceptions import ObjectDoesNotExist
+from asgiref.sync import sync_to_async
 from django.contrib.sites.managers import CurrentSiteManager
 from dateutil import parser
-from django.utils.timezone import localtime
+from django.db import models, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Max, Q
+from django.utils.timezone import is_naive, make_aware, now
 
+from django_calendar import instrumentation
+from django_calendar.cache import result_cache
+from django_calendar.conf import get_occurrences_horizon, get_parallel_chunk_size, get_parallel_threshold
+from django_calendar.instrumentation import instrumented
+from django_calendar.models.values import EventOccurrence
+from django_calendar.parallel import expand_parallel
 
-class EventManager(CurrentSiteManager):
 
-    def list_by_date(self, datahr, calendar):
-        result = []
-        for event in self.filter(calendar=calendar).order_by('dtstart'):
-            try:
-                datetimes = event.rrule.get_datetimes(event.dtstart.replace(hour=0, minute=0))
-                lista = [date(d.year, d.month, d.day) for d in datetimes]
-                data = date(datahr.year, datahr.month, datahr.day)
-                if data in lista:
-                    result.append((event.id, event.get_object(data)))
-            except ObjectDoesNotExist:
-                dtstart = localtime(event.dtstart)
-                if (
-                    dtstart.year == datahr.year
-                    and dtstart.month == datahr.month
-                    and dtstart.day == datahr.day
-                ):
-                    result.append((event.id, event.get_object(event.dtstart.replace(hour=0, minute=0))))
-        return sorted(result, key=cmp_to_key(lambda a, b: (a[1]['dtstart'] - b[1]['dtstart']).days))
+LISTING_FIELDS = ['calendar', 'calendar__tzid', 'uid', 'summary', 'dtstart', 'dtend', 'status', 'tzid']
+RRULE_FIELDS = [
+    'freq', 'interval', 'repeat', 'until', 'count', 'byday', 'bymonth', 'bymonthdate', 'bymonthday', 'rule_text',
+]
+
+
+def get_window(start, end):
+    """ Intervalo de datetimes que cobre os dias de start a end em qualquer fuso: do início do dia start
+        em UTC+14 ao fim do dia end em UTC-12, já que os dias das ocorrências são os do fuso de cada evento.
+    """
+    start = datetime(start.year, start.month, start.day, tzinfo=timezone.utc) - timedelta(hours=14)
+    end = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1, hours=12)
+    return start, end
+
+
+def occurrence_key(occurrence):
+    return occurrence[2].dtstart, occurrence[1]
+
+
+def get_expanded_range(start, end, tzinfo=None):
+    """ Dias a expandir para listar de start a end: com a conversão para outro fuso, um dia a mais em cada
+        lado, porque a data de uma ocorrência no fuso do evento e no de quem a vê podem diferir.
+    """
+    if tzinfo is None:
+        return start, end
+    return start - timedelta(days=1), end + timedelta(days=1)
+
+
+def get_range_key(calendar, version, start, end, tzinfo=None):
+    return (calendar.pk, version, start, end) + (() if tzinfo is None else (tzinfo,))
+
+
+def group_by_date(occurrences, start, end, tzinfo=None):
+    """ Agrupa ocorrências (data, id do evento, objeto) de start a end em um dicionário ordenado por data.
+        Com `tzinfo`, início e fim são convertidos de uma vez para esse fuso, e a data passa a ser a do
+        início convertido.
+    """
+    result = {}
+    for data, event_id, obj in occurrences:
+        if tzinfo is not None:
+            obj = EventOccurrence(obj.event, obj.dtstart.astimezone(tzinfo), obj.dtend.astimezone(tzinfo))
+            data = obj.dtstart.date()
+        if start <= data <= end:
+            result.setdefault(data, []).append((event_id, obj))
+    instrumentation.add('occurrences', sum(len(occurrences) for occurrences in result.values()))
+    return dict(sorted(result.items()))
+
+
+async def aget_list(queryset):
+    """ Lista os objetos de um queryset pelo ORM assíncrono; o chunk_size permite usar prefetch_related. """
+    return [obj async for obj in queryset.aiterator(chunk_size=2000)]
+
+
+def merge_intervals(intervals):
+    """ Une, em uma única passagem, intervalos (início, fim) ordenados pelo início que se sobrepõem ou se tocam. """
+    current = None
+    for interval_start, interval_end in intervals:
+        if current is not None and interval_start <= current[1]:
+            current[1] = max(current[1], interval_end)
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [interval_start, interval_end]
+    if current is not None:
+        yield tuple(current)
+
+
+def iter_free(busy, start, end, min_free):
+    """ Intervalos livres entre start e end, de ao menos `min_free`, a partir dos intervalos ocupados já unidos. """
+    free_start = start
+    for busy_start, busy_end in busy + [(end, end)]:
+        if busy_start - free_start >= min_free:
+            yield free_start, busy_start
+        free_start = busy_end
+
+
+class CalendarManager(CurrentSiteManager):
+
+    def bump_version(self, **filters):
+        """ Incrementa, no próprio banco, a versão dos calendários filtrados, marcando que algum evento,
+            regra ou data excluída deles mudou. Resultados guardados sob a versão anterior deixam de ser usados.
+        """
+        calendars = self.filter(**filters)
+        if result_cache.is_enabled():
+            result_cache.invalidate(*calendars.values_list('pk', flat=True))
+        return calendars.update(version=F('version') + 1, modified=now())
+
+    def get_version(self, calendar):
+        return self.filter(pk=calendar.pk).values_list('version', flat=True).first()
+
+    async def aget_version(self, calendar):
+        return await self.filter(pk=calendar.pk).values_list('version', flat=True).afirst()
+
+
+class EventQuerySet(models.QuerySet):
+
+    def single(self):
+        return self.filter(rrule__isnull=True).select_related('calendar').only(*LISTING_FIELDS)
+
+    def recurring(self):
+        return (
+            self.filter(rrule__isnull=False)
+            .select_related('calendar', 'rrule')
+            .prefetch_related('exdate')
+            .only(*LISTING_FIELDS, *['rrule__{}'.format(field) for field in RRULE_FIELDS])
+        )
+
+    def active_between(self, start, end=None):
+        single = Q(rrule__isnull=True, dtend__gte=start)
+        recurring = Q(rrule__isnull=False) & (
+            Q(rrule__last_occurrence__isnull=True) | Q(rrule__last_occurrence__gte=start)
+        )
+        if end is not None:
+            single &= Q(dtstart__lte=end)
+            recurring &= Q(dtstart__lte=end)
+        return self.filter(single | recurring)
+
+    def longest_duration(self):
+        """ Maior duração (dtend - dtstart) entre os eventos, em uma consulta; timedelta(0) sem eventos. """
+        duration = ExpressionWrapper(F('dtend') - F('dtstart'), output_field=DurationField())
+        return self.aggregate(longest=Max(duration))['longest'] or timedelta(0)
+
+
+class EventManager(CurrentSiteManager.from_queryset(EventQuerySet)):
+
+    def get_single_events(self, calendar):
+        return self.filter(calendar=calendar).single().order_by('dtstart')
+
+    def get_recurring_events(self, calendar):
+        return self.filter(calendar=calendar).recurring().order_by('dtstart')
+
+    def get_occurrence_manager(self):
+        return self.model._meta.get_field('occurrences').related_model.objects
+
+    def get_calendar_manager(self):
+        return self.model._meta.get_field('calendar').related_model.objects
+
+    def get_rule_manager(self):
+        return self.model._meta.get_field('rrule').related_model.objects
+
+    def expand(self, recurring_events, single_events, start, end, executor=None):
+        """ Ocorrências dos eventos entre as datas start e end, em ordem de (dtstart, id do evento). Com um
+            `executor`, as regras são expandidas em paralelo quando há ao menos CALENDAR_PARALLEL_THRESHOLD
+            eventos recorrentes; caso contrário são expandidas sob demanda, conforme o resultado é consumido.
+        """
+        recurring_events = list(recurring_events)
+        single_events = list(single_events)
+        instrumentation.add('events', len(recurring_events) + len(single_events))
+        if executor is not None and len(recurring_events) >= get_parallel_threshold():
+            occurrences = expand_parallel(recurring_events, start, end, executor, get_parallel_chunk_size())
+        else:
+            occurrences = [event.iter_occurrences(start, end, event.rrule) for event in recurring_events]
+        occurrences += [event.iter_occurrences(start, end) for event in single_events]
+        return heapq.merge(*occurrences, key=occurrence_key)
+
+    def iter_occurrences(self, calendar, start, end, executor=None):
+        """ Ocorrências (data, id do evento, objeto) do calendário entre as datas start e end, em ordem de
+            (dtstart, id do evento).
+        """
+        start = date(start.year, start.month, start.day)
+        end = date(end.year, end.month, end.day)
+        if calendar.has_occurrences(start, end):
+            yield from self.get_occurrence_manager().iter_occurrences([calendar], start, end)
+            return
+        window = get_window(start, end)
+        yield from self.expand(
+            self.get_recurring_events(calendar).active_between(*window),
+            self.get_single_events(calendar).active_between(*window),
+            start,
+            end,
+            executor,
+        )
+
+    @instrumented('upcoming')
+    def upcoming(self, calendars, after=None, limit=10):
+        """ As próximas `limit` ocorrências dos calendários com dtstart a partir de `after` (por padrão, agora). """
+        after = after or now()
+        recurring_events = self.filter(calendar__in=calendars).recurring().active_between(after)
+        single_events = self.filter(calendar__in=calendars, dtstart__gte=after).single().order_by('dtstart', 'id')
+        return self.merge_upcoming(recurring_events, single_events[:limit], after, limit)
+
+    def merge_upcoming(self, recurring_events, single_events, after, limit):
+        start = (after - timedelta(days=1)).date()
+        occurrences = [
+            (occurrence for occurrence in event.iter_occurrences(start, None, event.rrule)
+             if occurrence[2].dtstart >= after)
+            for event in recurring_events
+        ]
+        occurrences.append(
+            chain.from_iterable(event.iter_occurrences(date.min, date.max) for event in single_events)
+        )
+        result = list(islice(heapq.merge(*occurrences, key=occurrence_key), limit))
+        instrumentation.add('occurrences', len(result))
+        return result
+
+    async def aupcoming(self, calendars, after=None, limit=10):
+        """ Como upcoming, com as consultas dos eventos recorrentes e dos únicos de todos os calendários feitas
+            ao mesmo tempo. As ocorrências são expandidas e ordenadas fora do event loop.
+        """
+        after = after or now()
+        events = self.filter(calendar__in=calendars)
+        recurring_events, single_events = await asyncio.gather(
+            aget_list(events.recurring().active_between(after)),
+            aget_list(events.filter(dtstart__gte=after).single().order_by('dtstart', 'id')[:limit]),
+        )
+        return await sync_to_async(self.merge_upcoming, thread_sensitive=False)(
+            recurring_events, single_events, after, limit,
+        )
+
+    @instrumented('list_by_date')
+    def list_by_date(self, datahr, calendar, version=None, tzinfo=None):
+        data = date(datahr.year, datahr.month, datahr.day)
+        return self.list_by_range(calendar, data, data, version=version, tzinfo=tzinfo).get(data, [])
+
+    @instrumented('list_by_range')
+    def list_by_range(self, calendar, start, end, executor=None, version=None, tzinfo=None):
+        """ Ocorrências do calendário entre as datas start e end, agrupadas por data. As datas e horários são
+            os do fuso de cada evento ou, com `tzinfo`, convertidos para esse fuso. Com CALENDAR_RESULT_CACHE
+            configurado, o resultado é guardado no cache sob (calendário, versão, período); a versão é lida do
+            calendário, a menos que já seja conhecida e passada em `version`.
+        """
+        start = date(start.year, start.month, start.day)
+        end = date(end.year, end.month, end.day)
+        if not result_cache.is_enabled():
+            return self.build_by_range(calendar, start, end, executor, tzinfo)
+        if version is None:
+            version = self.get_calendar_manager().get_version(calendar)
+        return result_cache.get(
+            get_range_key(calendar, version, start, end, tzinfo),
+            lambda: self.build_by_range(calendar, start, end, executor, tzinfo),
+        )
+
+    async def alist_by_date(self, datahr, calendar, version=None, tzinfo=None):
+        data = date(datahr.year, datahr.month, datahr.day)
+        return (await self.alist_by_range(calendar, data, data, version, tzinfo)).get(data, [])
+
+    async def alist_by_range(self, calendar, start, end, version=None, tzinfo=None):
+        """ Como list_by_range, com as consultas pelo ORM assíncrono e a expansão das regras fora do event loop. """
+        start = date(start.year, start.month, start.day)
+        end = date(end.year, end.month, end.day)
+        if not result_cache.is_enabled():
+            return await self.abuild_by_range(calendar, start, end, tzinfo)
+        if version is None:
+            version = await self.get_calendar_manager().aget_version(calendar)
+        return await result_cache.aget(
+            get_range_key(calendar, version, start, end, tzinfo),
+            lambda: self.abuild_by_range(calendar, start, end, tzinfo),
+        )
+
+    def build_by_range(self, calendar, start, end, executor=None, tzinfo=None):
+        occurrences = self.iter_occurrences(calendar, *get_expanded_range(start, end, tzinfo), executor)
+        return group_by_date(occurrences, start, end, tzinfo)
+
+    async def abuild_by_range(self, calendar, start, end, tzinfo=None):
+        expanded_start, expanded_end = get_expanded_range(start, end, tzinfo)
+        if calendar.has_occurrences(expanded_start, expanded_end):
+            occurrences = self.get_occurrence_manager().get_occurrences([calendar], expanded_start, expanded_end)
+            occurrences = [
+                (occurrence.day, occurrence.event_id, occurrence.get_object())
+                async for occurrence in occurrences.aiterator()
+            ]
+        else:
+            window = get_window(expanded_start, expanded_end)
+            recurring_events, single_events = await asyncio.gather(
+                aget_list(self.get_recurring_events(calendar).active_between(*window)),
+                aget_list(self.get_single_events(calendar).active_between(*window)),
+            )
+            occurrences = self.expand(recurring_events, single_events, expanded_start, expanded_end)
+        return await sync_to_async(group_by_date, thread_sensitive=False)(occurrences, start, end, tzinfo)
+
+    def iter_by_calendars(self, calendars, start, end, executor=None):
+        """ Ocorrências (data, id do evento, objeto) de vários calendários entre as datas start e end, em
+            ordem de (dtstart, id do evento). Os eventos, regras e datas excluídas de todos eles são buscados
+            em um número fixo de consultas.
+        """
+        start = date(start.year, start.month, start.day)
+        end = date(end.year, end.month, end.day)
+        calendars = list(calendars)
+        covered = [calendar.pk for calendar in calendars if calendar.has_occurrences(start, end)]
+        expanded = [calendar.pk for calendar in calendars if calendar.pk not in covered]
+
+        occurrences = []
+        if covered:
+            occurrences.append(self.get_occurrence_manager().iter_occurrences(covered, start, end))
+        if expanded:
+            events = self.filter(calendar__in=expanded).active_between(*get_window(start, end))
+            occurrences.append(self.expand(events.recurring(), events.single(), start, end, executor))
+        return heapq.merge(*occurrences, key=occurrence_key)
+
+    @instrumented('list_by_calendars')
+    def list_by_calendars(self, calendars, start, end, executor=None):
+        """ Como list_by_range, para vários calendários de uma vez, com o resultado indexado pelo uid de cada
+            calendário.
+        """
+        calendars = list(calendars)
+        uids = {calendar.pk: calendar.uid for calendar in calendars}
+        result = {uid: {} for uid in uids.values()}
+        for data, event_id, obj in self.iter_by_calendars(calendars, start, end, executor):
+            result[uids[obj.event.calendar_id]].setdefault(data, []).append((event_id, obj))
+        instrumentation.add('occurrences', sum(
+            len(occurrences) for days in result.values() for occurrences in days.values()
+        ))
+        return {uid: dict(sorted(days.items())) for uid, days in result.items()}
+
+    @instrumented('free_busy')
+    def free_busy(self, calendars, start, end, tentative=True, min_free=None):
+        """ Intervalos (início, fim) ocupados nos calendários entre os datetimes start e end, com as
+            sobreposições unidas, como em um VFREEBUSY. Eventos cancelados não ocupam o período e os
+            tentativos só ocupam com `tentative`. Devolve {'busy': [...], 'free': [...]}, com os intervalos
+            livres de ao menos `min_free` (um timedelta) ou, sem `min_free`, None em 'free'.
+        """
+        statuses = {'CONFIRMED', 'TENTATIVE'} if tentative else {'CONFIRMED'}
+        calendars = list(calendars)
+        # Os dias das ocorrências são os do fuso de cada evento, no máximo um dia antes ou depois do dia em UTC;
+        # o início recua ainda a maior duração, para incluir eventos que começaram antes e ainda duram.
+        longest = self.filter(calendar__in=calendars).longest_duration()
+        occurrences = self.iter_by_calendars(
+            calendars,
+            start.astimezone(timezone.utc) - longest - timedelta(days=1),
+            end.astimezone(timezone.utc) + timedelta(days=1),
+        )
+        busy = list(merge_intervals(
+            (max(obj.dtstart, start), min(obj.dtend, end)) for data, event_id, obj in occurrences
+            if obj.status in statuses and obj.dtstart < end and obj.dtend > start
+        ))
+        free = None if min_free is None else list(iter_free(busy, start, end, min_free))
+        return {'busy': busy, 'free': free}
+
+    @instrumented('find_conflicts')
+    def find_conflicts(self, calendar, dtstart, dtend, rrule=None, until=None):
+        """ Ocorrências (id do evento, objeto) do calendário que se sobrepõem a um evento candidato de dtstart
+            a dtend, repetido pela RRULE `rrule`, se houver, até a data `until` (para regras infinitas, por
+            padrão, o horizonte de CALENDAR_OCCURRENCES_HORIZON dias). Eventos cancelados não conflitam.
+            Datas sem fuso são interpretadas no fuso do calendário.
+
+            As ocorrências existentes do período são lidas uma vez, ordenadas por início; cada ocorrência do
+            candidato é comparada apenas com as que começam antes do seu fim e depois do seu início menos a
+            maior duração existente, localizadas por busca binária.
+        """
+        event = self.model(calendar=calendar, dtstart=dtstart, dtend=dtend)
+        if is_naive(dtstart):
+            event.dtstart = make_aware(dtstart, event.get_zone())
+        if is_naive(dtend):
+            event.dtend = make_aware(dtend, event.get_zone())
+        event.excluded_dates = []
+        if rrule is None:
+            candidates = [obj for data, event_id, obj in event.iter_occurrences(date.min, date.max)]
+        else:
+            rule = self.get_rule_manager().build_by_rrule(event, rrule)
+            first = event.get_local_dtstart().date()
+            if until is None:
+                until = first + timedelta(days=get_occurrences_horizon())
+            candidates = [obj for data, event_id, obj in event.iter_occurrences(first, until, rule)]
+        if not candidates:
+            return []
+
+        # Eventos que começaram antes e ainda duram também conflitam: a janela recua a maior duração do calendário.
+        longest = self.filter(calendar=calendar).longest_duration()
+        start = (candidates[0].dtstart - longest).date() - timedelta(days=1)
+        end = max(candidate.dtend for candidate in candidates).date() + timedelta(days=1)
+        occurrences = [
+            (event_id, obj) for data, event_id, obj in self.iter_occurrences(calendar, start, end)
+            if obj.status != 'CANCELLED' and obj.dtend > candidates[0].dtstart
+        ]
+        starts = [obj.dtstart for event_id, obj in occurrences]
+
+        conflicts = {}
+        for candidate in candidates:
+            for index in range(
+                bisect_left(starts, candidate.dtstart - longest), bisect_left(starts, candidate.dtend),
+            ):
+                event_id, obj = occurrences[index]
+                if obj.dtend > candidate.dtstart:
+                    conflicts[obj.dtstart, event_id] = (event_id, obj)
+        return [conflicts[key] for key in sorted(conflicts)]
+
+
+class OccurrenceManager(CurrentSiteManager):
+
+    def get_occurrences(self, calendars, start, end):
+        return (
+            self.filter(calendar__in=calendars, day__range=(start, end))
+            .select_related('event__calendar')
+            .only(
+                'calendar', 'day', 'dtstart', 'dtend',
+                'event__calendar', 'event__calendar__tzid', 'event__uid', 'event__summary', 'event__status',
+                'event__tzid',
+            )
+            .order_by('dtstart', 'event_id')
+        )
+
+    def iter_occurrences(self, calendars, start, end):
+        for occurrence in self.get_occurrences(calendars, start, end):
+            yield occurrence.day, occurrence.event_id, occurrence.get_object()
+
+    def materialize(self, event, start, end, rule=None):
+        self.filter(event=event, day__range=(start, end)).delete()
+        return self.bulk_create(
+            self.model(
+                event=event,
+                calendar_id=event.calendar_id,
+                day=data,
+                dtstart=obj.dtstart,
+                dtend=obj.dtend,
+                status=obj.status,
+            )
+            for data, event_id, obj in event.iter_occurrences(start, end, rule)
+        )
 
 
 class RecurrencyRuleManager(CurrentSiteManager):
 
-    def create_by_rrule(self, event, rrule):
+    def parse_rrule(self, rrule):
         rules = rrule.split(';')
         fields = {}
         for rule in rules:
@@ -84,15 +484,37 @@ class RecurrencyRuleManager(CurrentSiteManager):
                 return fields.get('byday', None)
             return None
 
-        return self.create(
-            event=event,
-            freq=get_freq(),
-            interval=int(fields.get('interval', 1)),
-            repeat=get_repeat(),
-            until=get_until(),
-            count=get_count(),
-            byday=get_byday(),
-            bymonth=get_bymonth(),
-            bymonthdate=get_bymonthdate(),
-            bymonthday=get_bymonthday(),
-        )
+        return {
+            'freq': get_freq(),
+            'interval': int(fields.get('interval', 1)),
+            'repeat': get_repeat(),
+            'until': get_until(),
+            'count': get_count(),
+            'byday': get_byday(),
+            'bymonth': get_bymonth(),
+            'bymonthdate': get_bymonthdate(),
+            'bymonthday': get_bymonthday(),
+        }
+
+    def build_by_rrule(self, event, rrule):
+        rule = self.model(event=event, **self.parse_rrule(rrule))
+        rule.update_spec()
+        return rule
+
+    def create_by_rrule(self, event, rrule):
+        return self.create(event=event, **self.parse_rrule(rrule))
+
+    def create_by_rrule_bulk(self, rules, batch_size=500):
+        """ Cria com bulk_create as regras de uma sequência de pares (evento, RRULE). Devolve as regras criadas
+            e os pares rejeitados, como (evento, RRULE, erro). Não envia sinais: para manter a tabela de
+            ocorrências, chame django_calendar.occurrences.materialize_events depois.
+        """
+        objs = []
+        rejected = []
+        for event, rrule in rules:
+            try:
+                objs.append(self.build_by_rrule(event, rrule))
+            except (KeyError, ValueError, TypeError) as error:
+                rejected.append((event, rrule, error))
+        with transaction.atomic():
+            return self.bulk_create(objs, batch_size=batch_size), rejected
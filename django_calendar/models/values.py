@@ -0,0 +1,42 @@
+from collections.abc import Mapping
+
+
+class EventOccurrence(Mapping):
+    """ Ocorrência de um evento: referencia o evento, compartilhado entre as ocorrências, e guarda apenas o
+        início e o fim. Também pode ser lida como o dicionário retornado antes por Event.get_object.
+    """
+
+    __slots__ = ('event', 'dtstart', 'dtend')
+
+    KEYS = ('uid', 'summary', 'dtstart', 'dtend', 'status')
+
+    def __init__(self, event, dtstart, dtend):
+        self.event = event
+        self.dtstart = dtstart
+        self.dtend = dtend
+
+    @property
+    def uid(self):
+        return self.event.uid
+
+    @property
+    def summary(self):
+        return self.event.summary
+
+    @property
+    def status(self):
+        return self.event.status
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return '<EventOccurrence: {} {}>'.format(self.summary, self.dtstart.isoformat())
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from django_calendar.conf import get_occurrences_enabled, get_occurrences_horizon
+from django_calendar.models import Calendar, Event, Occurrence, RecurrencyRule
+from django_calendar.models.managers import get_window
+
+
+def materialize_event(event_id):
+    event = Event.objects.select_related('calendar').prefetch_related('exdate').filter(pk=event_id).first()
+    if event is None:
+        return
+    # O evento pode ter saído de um calendário materializado: as ocorrências antigas saem antes da verificação.
+    Occurrence.objects.filter(event=event).delete()
+    if event.calendar.occurrences_start is None:
+        return
+    rule = RecurrencyRule.objects.filter(event=event).first()
+    with transaction.atomic():
+        Occurrence.objects.materialize(
+            event, event.calendar.occurrences_start, event.calendar.occurrences_end, rule,
+        )
+
+
+def materialize_calendar(calendar, end=None, start=None):
+    """ Mantém as ocorrências do calendário de `start` (por padrão, hoje) até `end` (por padrão, hoje mais o
+        horizonte configurado). O início avança a cada execução e as ocorrências anteriores a ele são
+        descartadas; das seguintes, apenas o trecho ainda não gerado é calculado. Devolve quantas foram geradas.
+    """
+    if start is None:
+        start = localdate()
+    if end is None:
+        end = localdate() + timedelta(days=get_occurrences_horizon())
+    if calendar.occurrences_start is not None:
+        start = max(start, calendar.occurrences_start)
+        if calendar.occurrences_end >= start:
+            end = max(end, calendar.occurrences_end)
+            first = calendar.occurrences_end + timedelta(days=1)
+        else:
+            first = start
+    else:
+        first = start
+
+    total = 0
+    window = get_window(first, end)
+    with transaction.atomic():
+        Occurrence.objects.filter(calendar=calendar, day__lt=start).delete()
+        if first <= end:
+            for event in Event.objects.get_recurring_events(calendar).active_between(*window):
+                total += len(Occurrence.objects.materialize(event, first, end, event.rrule))
+            for event in Event.objects.get_single_events(calendar).active_between(*window):
+                total += len(Occurrence.objects.materialize(event, first, end))
+        Calendar.objects.filter(pk=calendar.pk).update(occurrences_start=start, occurrences_end=end)
+    calendar.occurrences_start = start
+    calendar.occurrences_end = end
+    return total
+
+
+def materialize_events(calendar, event_ids, batch_size=500):
+    """ Regenera em lote as ocorrências de eventos gravados sem sinais, como pelo bulk_create de uma importação. """
+    if not get_occurrences_enabled() or calendar.occurrences_start is None:
+        return 0
+    start, end = calendar.occurrences_start, calendar.occurrences_end
+    Occurrence.objects.filter(event__in=event_ids).delete()
+    events = Event.objects.filter(pk__in=event_ids)
+    occurrences = chain(
+        chain.from_iterable(event.iter_occurrences(start, end, event.rrule) for event in events.recurring()),
+        chain.from_iterable(event.iter_occurrences(start, end) for event in events.single()),
+    )
+    return len(Occurrence.objects.bulk_create(
+        (
+            Occurrence(
+                event_id=event_id,
+                calendar_id=calendar.pk,
+                day=data,
+                dtstart=obj.dtstart,
+                dtend=obj.dtend,
+                status=obj.status,
+            )
+            for data, event_id, obj in occurrences
+        ),
+        batch_size=batch_size,
+    ))
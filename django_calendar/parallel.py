@@ -0,0 +1,41 @@
+from datetime import date
+
+from dateutil import rrule
+
+
+def expand_rule(spec):
+    event_id, rule_string, dtstart, exdates, after, before = spec
+    datetimes = rrule.rrulestr(rule_string, dtstart=dtstart)
+    if exdates:
+        ruleset = rrule.rruleset()
+        ruleset.rrule(datetimes)
+        for exdate in exdates:
+            ruleset.exdate(exdate)
+        datetimes = ruleset
+    return event_id, [date(d.year, d.month, d.day) for d in datetimes.between(after, before, inc=True)]
+
+
+def expand_rules(specs):
+    return [expand_rule(spec) for spec in specs]
+
+
+def iter_expanded(event, dates):
+    dtstart = event.get_local_dtstart()
+    for data in dates:
+        yield data, event.id, event.get_object(data, dtstart)
+
+
+def expand_parallel(events, start, end, executor, chunk_size):
+    """ Expande as regras dos eventos no executor, em lotes de `chunk_size` especificações (Event.get_rule_spec).
+        Os workers recebem apenas dados serializáveis e não usam o banco, então um ProcessPoolExecutor funciona
+        a partir de comandos de gerenciamento; em processos daemon, como workers prefork, use um ThreadPoolExecutor.
+        Devolve um gerador de ocorrências (data, id, objeto) em ordem para cada evento, pronto para o heapq.merge.
+    """
+    events = {event.id: event for event in events}
+    specs = [event.get_rule_spec(start, end, event.rrule) for event in events.values()]
+    chunks = [specs[i:i + chunk_size] for i in range(0, len(specs), chunk_size)]
+    return [
+        iter_expanded(events[event_id], dates)
+        for expanded in executor.map(expand_rules, chunks)
+        for event_id, dates in expanded
+    ]
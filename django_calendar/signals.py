@@ -0,0 +1,89 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django_calendar.cache import rule_cache
+from django_calendar.conf import get_occurrences_enabled
+from django_calendar.models import Calendar, Event, ExDate, RecurrencyRule
+from django_calendar.occurrences import materialize_event, materialize_events
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    if get_occurrences_enabled():
+        transaction.on_commit(partial(materialize_event, instance.pk))
+
+
+@receiver(post_save, sender=Event)
+def event_rule_spec(sender, instance, created, **kwargs):
+    rule = None if created else RecurrencyRule.objects.filter(event=instance).first()
+    if rule is not None:
+        rule.event = instance
+        rule.update_spec()
+        RecurrencyRule.objects.filter(pk=rule.pk).update(
+            rule_text=rule.rule_text, first_occurrence=rule.first_occurrence, last_occurrence=rule.last_occurrence,
+        )
+
+
+@receiver([post_save, post_delete], sender=RecurrencyRule)
+@receiver([post_save, post_delete], sender=ExDate)
+def rule_changed(sender, instance, **kwargs):
+    if get_occurrences_enabled():
+        transaction.on_commit(partial(materialize_event, instance.event_id))
+
+
+@receiver([post_save, post_delete], sender=RecurrencyRule)
+def rule_cache_invalidate(sender, instance, **kwargs):
+    rule_cache.invalidate(instance.pk)
+
+
+@receiver(pre_save, sender=Event)
+def event_previous_calendar(sender, instance, **kwargs):
+    """ Guarda o calendário gravado do evento, para que, se ele mudar de calendário, os dois tenham a versão
+        incrementada.
+    """
+    instance._previous_calendar_id = None
+    if not instance._state.adding:
+        instance._previous_calendar_id = (
+            sender._base_manager.filter(pk=instance.pk).values_list('calendar_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Event)
+def event_version_bump(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_calendar_id', None)
+    Calendar.objects.bump_version(pk__in={instance.calendar_id, previous} - {None})
+
+
+@receiver([post_save, post_delete], sender=RecurrencyRule)
+@receiver([post_save, post_delete], sender=ExDate)
+def rule_version_bump(sender, instance, **kwargs):
+    Calendar.objects.bump_version(event=instance.event_id)
+
+
+@receiver(pre_save, sender=Calendar)
+def calendar_previous_tzid(sender, instance, **kwargs):
+    instance._previous_tzid = None
+    if not instance._state.adding:
+        instance._previous_tzid = sender._base_manager.filter(pk=instance.pk).values_list('tzid', flat=True).first()
+
+
+@receiver(post_save, sender=Calendar)
+def calendar_tzid_changed(sender, instance, created, **kwargs):
+    """ Com outro fuso, os eventos sem fuso próprio passam a ser expandidos nele: recalcula os limites das
+        regras deles, regenera as suas ocorrências materializadas e incrementa a versão do calendário.
+    """
+    if created or getattr(instance, '_previous_tzid', None) in (None, instance.tzid):
+        return
+    rules = list(
+        RecurrencyRule.objects.filter(event__calendar=instance, event__tzid='').select_related('event__calendar')
+    )
+    for rule in rules:
+        rule.update_spec()
+    RecurrencyRule.objects.bulk_update(rules, ['rule_text', 'first_occurrence', 'last_occurrence'], batch_size=500)
+    if get_occurrences_enabled():
+        event_ids = list(Event.objects.filter(calendar=instance, tzid='').values_list('pk', flat=True))
+        transaction.on_commit(partial(materialize_events, instance, event_ids))
+    Calendar.objects.bump_version(pk=instance.pk)
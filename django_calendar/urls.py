@@ -0,0 +1,10 @@
+from django.urls import path
+
+from django_calendar.views import calendar_feed
+
+
+app_name = 'calendar'
+
+urlpatterns = [
+    path('<uuid:uid>.ics', calendar_feed, name='feed'),
+]
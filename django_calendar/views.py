@@ -0,0 +1,28 @@
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+from django_calendar.exports import iter_ics
+from django_calendar.models import Calendar
+
+
+def get_feed_state(uid):
+    return Calendar.objects.filter(uid=uid).values('pk', 'version', 'modified').first()
+
+
+def calendar_feed_etag(request, uid):
+    state = get_feed_state(uid)
+    return None if state is None else '{pk}-{version}'.format(**state)
+
+
+def calendar_feed_last_modified(request, uid):
+    state = get_feed_state(uid)
+    return None if state is None else state['modified']
+
+
+@condition(etag_func=calendar_feed_etag, last_modified_func=calendar_feed_last_modified)
+def calendar_feed(request, uid):
+    calendar = get_object_or_404(Calendar, uid=uid)
+    response = StreamingHttpResponse(iter_ics(calendar), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="{}.ics"'.format(calendar.uid)
+    return response
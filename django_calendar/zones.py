@@ -0,0 +1,23 @@
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+from django.utils.timezone import get_default_timezone
+from django.utils.translation import gettext_lazy as _
+
+
+@lru_cache(maxsize=None)
+def get_zoneinfo(tzid):
+    return ZoneInfo(tzid)
+
+
+def get_zone(tzid):
+    """ Fuso de um tzid da IANA, guardado após a primeira consulta; sem tzid, o fuso de TIME_ZONE. """
+    return get_zoneinfo(tzid) if tzid else get_default_timezone()
+
+
+def validate_tzid(value):
+    try:
+        get_zone(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(_('Fuso horário desconhecido: %(value)s.'), params={'value': value})
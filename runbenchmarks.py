@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+""" Benchmarks de expansão e listagem de ocorrências sobre um calendário sintético, usando as configurações
+    de tests/settings.py em um banco de teste. Mede tempo, consultas e pico de memória de cada operação e
+    escreve o resultado em JSON, para comparar versões:
+
+        python runbenchmarks.py --events 2000 --recurring 0.7 --exdates 2 --horizon 365 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+
+import django
+
+
+FREQS = [
+    'FREQ=DAILY;INTERVAL={interval}',
+    'FREQ=WEEKLY;INTERVAL={interval};BYDAY={weekday},{other_weekday}',
+    'FREQ=MONTHLY;INTERVAL={interval};BYMONTHDAY={day}',
+    'FREQ=MONTHLY;INTERVAL={interval};BYDAY=2{weekday}',
+    'FREQ=YEARLY;INTERVAL={interval};BYMONTH={month};BYMONTHDAY={day}',
+    'FREQ=YEARLY;INTERVAL={interval};BYMONTH={month};BYDAY=1{weekday}',
+]
+REPEATS = ['', ';COUNT={count}', ';UNTIL={until}']
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description='Benchmarks do django_calendar.')
+    parser.add_argument('--events', type=int, default=1000, help='eventos no calendário')
+    parser.add_argument('--recurring', type=float, default=0.5, help='fração de eventos recorrentes')
+    parser.add_argument('--exdates', type=int, default=1, help='datas excluídas por evento recorrente')
+    parser.add_argument('--horizon', type=int, default=365, help='dias cobertos pelos eventos e listagens')
+    parser.add_argument('--days', type=int, default=30, help='dias consultados com list_by_date')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções de cada operação')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='arquivo JSON; por padrão, a saída padrão')
+    return parser.parse_args()
+
+
+def build_rows(arguments):
+    """ Linhas no formato de django_calendar.imports.import_events, com as regras distribuídas entre as seis
+        frequências e os três tipos de repetição.
+    """
+    rng = random.Random(arguments.seed)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for index in range(arguments.events):
+        dtstart = first + timedelta(days=rng.randrange(arguments.horizon), minutes=15 * rng.randrange(96))
+        row = {
+            'summary': 'Evento {}'.format(index),
+            'dtstart': dtstart,
+            'dtend': dtstart + timedelta(minutes=30 * rng.randint(1, 4)),
+        }
+        if rng.random() < arguments.recurring:
+            weekday, other_weekday = rng.sample(WEEKDAYS, 2)
+            row['rrule'] = FREQS[index % len(FREQS)].format(
+                interval=rng.randint(1, 3), weekday=weekday, other_weekday=other_weekday,
+                day=rng.randint(1, 28), month=rng.randint(1, 12),
+            ) + REPEATS[index // len(FREQS) % len(REPEATS)].format(
+                count=rng.randint(5, 50),
+                until=(dtstart + timedelta(days=arguments.horizon)).strftime('%Y%m%dT%H%M%SZ'),
+            )
+            row['exdate'] = [
+                dtstart + timedelta(days=rng.randrange(1, arguments.horizon)) for _ in range(arguments.exdates)
+            ]
+        rows.append(row)
+    return rows
+
+
+def measure(name, function, repeat, setup=None):
+    """ Executa `function` `repeat` vezes e devolve a mediana e o menor tempo. Uma execução a mais, com o
+        tracemalloc ativo, mede as consultas e o pico de memória. `setup`, se houver, roda antes de cada
+        execução, fora da medição.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'median': statistics.median(timings),
+        'best': min(timings),
+        'queries': len(queries),
+        'peak_memory': peak,
+    }
+
+
+def run(arguments):
+    from django.core.cache import cache
+
+    from django_calendar.cache import rule_cache
+    from django_calendar.exports import iter_ics
+    from django_calendar.imports import import_events, import_ics
+    from django_calendar.models import Calendar, Event, RecurrencyRule
+
+    rows = build_rows(arguments)
+    rules = [row['rrule'] for row in rows if 'rrule' in row]
+    start = date(2024, 1, 1)
+    end = start + timedelta(days=arguments.horizon)
+    days = [start + timedelta(days=day * arguments.horizon // arguments.days) for day in range(arguments.days)]
+
+    def clear():
+        rule_cache.clear()
+        cache.clear()
+
+    def import_rows():
+        import_events(Calendar.objects.create(summary='Benchmark'), rows)
+
+    results = [measure('import_events', import_rows, arguments.repeat)]
+    calendar = Calendar.objects.create(summary='Benchmark')
+    import_events(calendar, rows)
+    ics = ''.join(iter_ics(calendar))
+    recurring = list(Event.objects.get_recurring_events(calendar))
+
+    def compile_rules():
+        return [event.rrule.get_datetimes(event.get_local_dtstart()) for event in recurring]
+
+    results += [
+        measure('parse_rrule', lambda: [RecurrencyRule.objects.parse_rrule(rule) for rule in rules], arguments.repeat),
+        measure('compile_rules_cold', compile_rules, arguments.repeat, rule_cache.clear),
+        measure('compile_rules_warm', compile_rules, arguments.repeat, compile_rules),
+        measure(
+            'list_by_date',
+            lambda: [Event.objects.list_by_date(day, calendar) for day in days],
+            arguments.repeat,
+            clear,
+        ),
+        measure(
+            'list_by_range_month',
+            lambda: Event.objects.list_by_range(calendar, start, start + timedelta(days=30)),
+            arguments.repeat,
+            clear,
+        ),
+        measure('list_by_range', lambda: Event.objects.list_by_range(calendar, start, end), arguments.repeat, clear),
+        measure('export_ics', lambda: ''.join(iter_ics(calendar)), arguments.repeat),
+        measure(
+            'import_ics',
+            lambda: import_ics(Calendar.objects.create(summary='Benchmark'), StringIO(ics)),
+            arguments.repeat,
+        ),
+    ]
+    return {
+        'parameters': vars(arguments),
+        'versions': {'python': sys.version.split()[0], 'django': django.get_version()},
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    arguments = get_arguments()
+    os.environ["DJANGO_SETTINGS_MODULE"] = "tests.settings"
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    report = json.dumps(run(arguments), indent=2, default=str)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
@@ -48,6 +48,8 @@ TEMPLATES = [
     },
 ]
 
+ROOT_URLCONF = 'tests.urls'
+
 WSGI_APPLICATION = 'server.wsgi.application'
 
 DATABASES = {
@@ -1,8 +1,34 @@
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from itertools import islice
+from tempfile import NamedTemporaryFile
+from uuid import NAMESPACE_URL, uuid4, uuid5
+from zoneinfo import ZoneInfo
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate, localtime, make_aware
 
-from django_calendar.models import Calendar, Event, RecurrencyRule
+from django_calendar.cache import RuleCache, result_cache, rule_cache
+from django_calendar.exports import iter_ics
+from django_calendar.imports import import_events, import_ics, iter_vevents
+from django_calendar.instrumentation import span_finished
+from django_calendar.models import Calendar, Event, ExDate, Occurrence, RecurrencyRule
+from django_calendar.occurrences import materialize_calendar
+
+SPANS = []
+
+
+def record_span(span):
+    SPANS.append(span)
 
 
 class CalendarTestCase(TestCase):
@@ -30,6 +56,23 @@ class SummaryMixinTestCase(CalendarTestCase):
         self.assertEqual(str(self.event), 'EventManagerTestCase')
 
 
+class EventOccurrenceTestCase(CalendarTestCase):
+
+    def test_get_object_a(self):
+        obj = self.event.get_object(date(2024, 9, 5))
+        self.assertEqual(obj['dtstart'], datetime(2024, 9, 5, 10, 0))
+        self.assertEqual(obj.dtend, datetime(2024, 9, 5, 11, 0))
+        self.assertEqual(dict(obj), {
+            'uid': self.event.uid,
+            'summary': 'EventManagerTestCase',
+            'dtstart': datetime(2024, 9, 5, 10, 0),
+            'dtend': datetime(2024, 9, 5, 11, 0),
+            'status': 'CONFIRMED',
+        })
+        self.assertEqual(obj, dict(obj))
+        self.assertRaises(KeyError, lambda: obj['sequence'])
+
+
 class EventManagerTestCase(CalendarTestCase):
 
     def test_list_by_date_a(self):
@@ -144,7 +187,326 @@ class EventManagerTestCase(CalendarTestCase):
         self.assertEqual(lista[0][0], event2.id)
         self.assertEqual(lista[1][0], event1.id)
 
+    def test_list_by_date_k(self):
+        rrule = 'FREQ=DAILY;INTERVAL=3'
+        RecurrencyRule.objects.create_by_rrule(self.event, rrule)
+        self.assertIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2084, 9, 10), self.calendar)])
+        self.assertNotIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2084, 9, 11), self.calendar)])
+
+    def test_list_by_date_l(self):
+        rrule = 'FREQ=MONTHLY;INTERVAL=2;BYMONTHDAY=31'
+        RecurrencyRule.objects.create_by_rrule(self.event, rrule)
+        self.assertIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2060, 5, 31), self.calendar)])
+        self.assertNotIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2060, 8, 31), self.calendar)])
+
+    def test_list_by_date_queries(self):
+        for day in range(2, 12):
+            event = Event.objects.create(
+                calendar=self.calendar,
+                summary='EventManagerTestCase{}'.format(day),
+                dtstart=datetime(2024, 9, day, 8, 0),
+                dtend=datetime(2024, 9, day, 9, 0),
+            )
+            RecurrencyRule.objects.create_by_rrule(event, 'FREQ=DAILY;INTERVAL=1')
+            ExDate.objects.create(event=event, exdate=datetime(2024, 9, 20, 8, 0, tzinfo=timezone.utc))
+        with self.assertNumQueries(3):
+            self.assertEqual(len(Event.objects.list_by_date(datetime(2024, 9, 15), self.calendar)), 10)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.calendar.event_list_by_range(datetime(2024, 9, 1), datetime(2024, 9, 2))), 2)
+
+    def test_list_by_date_exdate(self):
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=1')
+        ExDate.objects.create(event=self.event, exdate=datetime(2024, 9, 3, 13, 0, tzinfo=timezone.utc))
+        ExDate.objects.create(event=self.event, exdate=datetime(2024, 9, 5, 13, 0, tzinfo=timezone.utc))
+        self.assertIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2024, 9, 2), self.calendar)])
+        self.assertNotIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2024, 9, 3), self.calendar)])
+        self.assertNotIn(self.event.id, [i[0] for i in Event.objects.list_by_date(datetime(2024, 9, 5), self.calendar)])
+        dias = Event.objects.list_by_range(self.calendar, datetime(2024, 9, 1), datetime(2024, 9, 6))
+        self.assertEqual(list(dias), [date(2024, 9, 1), date(2024, 9, 2), date(2024, 9, 4), date(2024, 9, 6)])
+
+    def test_iter_occurrences_a(self):
+        event = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase1',
+            dtstart=self.start_time,
+            dtend=self.end_time,
+        )
+        RecurrencyRule.objects.create_by_rrule(event, 'FREQ=DAILY;INTERVAL=1')
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=WEEKLY;INTERVAL=1')
+        occurrences = Event.objects.iter_occurrences(self.calendar, date(2024, 9, 1), date(2124, 9, 1))
+        self.assertEqual([(i[0], i[1]) for i in islice(occurrences, 4)], [
+            (date(2024, 9, 1), self.event.id),
+            (date(2024, 9, 1), event.id),
+            (date(2024, 9, 2), event.id),
+            (date(2024, 9, 3), event.id),
+        ])
+
+    def test_upcoming_a(self):
+        other = Calendar.objects.create(summary='EventManagerTestCase1')
+        event = Event.objects.create(
+            calendar=other,
+            summary='EventManagerTestCase1',
+            dtstart=datetime(2024, 9, 2, 12, 0, tzinfo=timezone.utc),
+            dtend=datetime(2024, 9, 2, 13, 0, tzinfo=timezone.utc),
+        )
+        RecurrencyRule.objects.create_by_rrule(event, 'FREQ=WEEKLY;INTERVAL=1;BYDAY=MO')
+        ExDate.objects.create(event=event, exdate=datetime(2024, 9, 16, 12, 0, tzinfo=timezone.utc))
+        single = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase2',
+            dtstart=datetime(2024, 9, 10, 12, 0, tzinfo=timezone.utc),
+            dtend=datetime(2024, 9, 10, 13, 0, tzinfo=timezone.utc),
+        )
+        upcoming = Event.objects.upcoming(
+            Calendar.objects.all(), after=datetime(2024, 9, 2, 12, 30, tzinfo=timezone.utc), limit=4,
+        )
+        self.assertEqual([(i[0], i[1]) for i in upcoming], [
+            (date(2024, 9, 9), event.id),
+            (date(2024, 9, 10), single.id),
+            (date(2024, 9, 23), event.id),
+            (date(2024, 9, 30), event.id),
+        ])
 
+    def test_list_by_calendars_a(self):
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=1;COUNT=3')
+        calendars = [self.calendar]
+        for day in range(2, 5):
+            calendar = Calendar.objects.create(summary='EventManagerTestCase{}'.format(day))
+            event = Event.objects.create(
+                calendar=calendar,
+                summary='EventManagerTestCase{}'.format(day),
+                dtstart=datetime(2024, 9, day, 8, 0),
+                dtend=datetime(2024, 9, day, 9, 0),
+            )
+            RecurrencyRule.objects.create_by_rrule(event, 'FREQ=WEEKLY;INTERVAL=1')
+            Event.objects.create(
+                calendar=calendar,
+                summary='EventManagerTestCase{}'.format(day),
+                dtstart=datetime(2024, 9, day, 10, 0),
+                dtend=datetime(2024, 9, day, 11, 0),
+            )
+            calendars.append(calendar)
+        with self.assertNumQueries(4):
+            result = Event.objects.list_by_calendars(Calendar.objects.all(), date(2024, 9, 1), date(2024, 9, 10))
+        self.assertEqual(list(result), [calendar.uid for calendar in calendars])
+        for calendar in calendars:
+            self.assertEqual(result[calendar.uid], calendar.event_list_by_range(date(2024, 9, 1), date(2024, 9, 10)))
+
+    @override_settings(CALENDAR_PARALLEL_THRESHOLD=2, CALENDAR_PARALLEL_CHUNK_SIZE=2)
+    def test_list_by_range_executor(self):
+        for day, rrule in enumerate(['FREQ=DAILY;INTERVAL=3', 'FREQ=WEEKLY;BYDAY=MO,FR', 'FREQ=MONTHLY;BYDAY=1SU']):
+            event = Event.objects.create(
+                calendar=self.calendar,
+                summary='EventManagerTestCase{}'.format(day),
+                dtstart=datetime(2024, 9, day + 1, 8, 0),
+                dtend=datetime(2024, 9, day + 1, 9, 0),
+            )
+            RecurrencyRule.objects.create_by_rrule(event, rrule)
+        ExDate.objects.create(event=event, exdate=datetime(2024, 10, 6, 8, 0, tzinfo=timezone.utc))
+        expected = self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 12, 31))
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 12, 31), executor), expected)
+        self.assertNotIn(date(2024, 10, 6), expected)
+
+    def test_active_between_a(self):
+        old = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase1',
+            dtstart=datetime(2020, 9, 1, 10, 0, tzinfo=timezone.utc),
+            dtend=datetime(2020, 9, 1, 11, 0, tzinfo=timezone.utc),
+        )
+        finished = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase2',
+            dtstart=datetime(2020, 9, 1, 10, 0, tzinfo=timezone.utc),
+            dtend=datetime(2020, 9, 1, 11, 0, tzinfo=timezone.utc),
+        )
+        RecurrencyRule.objects.create_by_rrule(finished, 'FREQ=DAILY;INTERVAL=1;UNTIL=20210101T000000Z')
+        forever = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase3',
+            dtstart=datetime(2020, 9, 1, 10, 0, tzinfo=timezone.utc),
+            dtend=datetime(2020, 9, 1, 11, 0, tzinfo=timezone.utc),
+        )
+        RecurrencyRule.objects.create_by_rrule(forever, 'FREQ=DAILY;INTERVAL=1')
+
+        events = Event.objects.active_between(
+            datetime(2024, 9, 1, tzinfo=timezone.utc), datetime(2024, 9, 2, tzinfo=timezone.utc),
+        )
+        self.assertIn(self.event, events)
+        self.assertIn(forever, events)
+        self.assertNotIn(old, events)
+        self.assertNotIn(finished, events)
+
+    def test_active_between_b(self):
+        counted = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase1',
+            dtstart=datetime(2024, 8, 1, 10, 0, tzinfo=timezone.utc),
+            dtend=datetime(2024, 8, 1, 11, 0, tzinfo=timezone.utc),
+        )
+        RecurrencyRule.objects.create_by_rrule(counted, 'FREQ=MONTHLY;BYMONTHDAY=15;COUNT=2')
+        self.assertIn(counted, Event.objects.active_between(datetime(2024, 9, 15, tzinfo=timezone.utc)))
+        self.assertNotIn(counted, Event.objects.active_between(datetime(2024, 9, 16, tzinfo=timezone.utc)))
+
+    def test_list_by_range_a(self):
+        rrule = 'FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,WE'
+        RecurrencyRule.objects.create_by_rrule(self.event, rrule)
+        dias = Event.objects.list_by_range(self.calendar, datetime(2024, 9, 1), datetime(2024, 9, 30))
+        self.assertEqual(list(dias), [
+            date(2024, 9, 2), date(2024, 9, 4), date(2024, 9, 9), date(2024, 9, 11), date(2024, 9, 16),
+            date(2024, 9, 18), date(2024, 9, 23), date(2024, 9, 25), date(2024, 9, 30),
+        ])
+        self.assertEqual(dias[date(2024, 9, 30)][0][0], self.event.id)
+        self.assertEqual(dias[date(2024, 9, 30)][0][1]['dtstart'].day, 30)
+
+    def test_list_by_range_b(self):
+        event = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase1',
+            dtstart=datetime(2024, 9, 2, 8, 0),
+            dtend=datetime(2024, 9, 2, 9, 0),
+        )
+        RecurrencyRule.objects.create_by_rrule(event, 'FREQ=DAILY;INTERVAL=1;COUNT=3')
+        dias = self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 9, 7))
+        self.assertEqual(list(dias), [date(2024, 9, 1), date(2024, 9, 2), date(2024, 9, 3), date(2024, 9, 4)])
+        self.assertEqual([i[0] for i in dias[date(2024, 9, 1)]], [self.event.id])
+        self.assertEqual([i[0] for i in dias[date(2024, 9, 4)]], [event.id])
+        self.assertEqual(dias, {
+            data: Event.objects.list_by_date(data, self.calendar) for data in dias
+        })
+
+
+class FindConflictsTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        weekly = Event.objects.create(
+            calendar=self.calendar,
+            summary='FindConflictsTestCase',
+            dtstart=make_aware(datetime(2024, 9, 2, 14, 0)),
+            dtend=make_aware(datetime(2024, 9, 2, 15, 0)),
+        )
+        RecurrencyRule.objects.create_by_rrule(weekly, 'FREQ=WEEKLY;BYDAY=MO')
+        Event.objects.create(
+            calendar=self.calendar,
+            summary='FindConflictsTestCase1',
+            dtstart=make_aware(datetime(2024, 9, 3, 14, 0)),
+            dtend=make_aware(datetime(2024, 9, 3, 15, 0)),
+            status='CANCELLED',
+        )
+
+    def test_find_conflicts_a(self):
+        conflicts = self.calendar.find_conflicts(
+            make_aware(datetime(2024, 9, 1, 10, 30)), make_aware(datetime(2024, 9, 1, 11, 30)),
+        )
+        self.assertEqual([event_id for event_id, obj in conflicts], [self.event.id])
+        self.assertEqual(self.calendar.find_conflicts(
+            make_aware(datetime(2024, 9, 1, 11, 0)), make_aware(datetime(2024, 9, 1, 12, 0)),
+        ), [])
+
+    def test_find_conflicts_b(self):
+        conflicts = self.calendar.find_conflicts(
+            make_aware(datetime(2024, 8, 30, 10, 30)),
+            make_aware(datetime(2024, 8, 30, 14, 30)),
+            'FREQ=DAILY;COUNT=11',
+        )
+        self.assertEqual([(obj['summary'], localtime(obj['dtstart']).date()) for event_id, obj in conflicts], [
+            ('EventManagerTestCase', date(2024, 9, 1)),
+            ('FindConflictsTestCase', date(2024, 9, 2)),
+            ('FindConflictsTestCase', date(2024, 9, 9)),
+        ])
+
+    def test_find_conflicts_c(self):
+        conflicts = self.calendar.find_conflicts(
+            make_aware(datetime(2024, 9, 3, 14, 0)),
+            make_aware(datetime(2024, 9, 3, 15, 0)),
+            'FREQ=WEEKLY;BYDAY=TU',
+            until=date(2024, 12, 31),
+        )
+        self.assertEqual(conflicts, [])
+
+    def test_find_conflicts_d(self):
+        conflicts = self.calendar.find_conflicts(datetime(2024, 9, 2, 14, 30), datetime(2024, 9, 2, 15, 30))
+        self.assertEqual([obj['summary'] for event_id, obj in conflicts], ['FindConflictsTestCase'])
+
+    def test_find_conflicts_e(self):
+        retreat = Event.objects.create(
+            calendar=self.calendar,
+            summary='FindConflictsTestCase2',
+            dtstart=make_aware(datetime(2024, 9, 1, 9, 0)),
+            dtend=make_aware(datetime(2024, 9, 6, 18, 0)),
+        )
+        conflicts = self.calendar.find_conflicts(
+            make_aware(datetime(2024, 9, 4, 10, 0)), make_aware(datetime(2024, 9, 4, 11, 0)),
+        )
+        self.assertEqual([event_id for event_id, obj in conflicts], [retreat.id])
+
+
+class FreeBusyTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = Calendar.objects.create(summary='FreeBusyTestCase')
+        for hours, status in [((10, 30, 12), 'TENTATIVE'), ((14, 0, 15), 'CANCELLED')]:
+            Event.objects.create(
+                calendar=self.other,
+                summary='FreeBusyTestCase',
+                dtstart=make_aware(datetime(2024, 9, 1, hours[0], hours[1])),
+                dtend=make_aware(datetime(2024, 9, 1, hours[2], 0)),
+                status=status,
+            )
+        self.start = make_aware(datetime(2024, 9, 1, 8, 0))
+        self.end = make_aware(datetime(2024, 9, 1, 18, 0))
+
+    def test_free_busy_a(self):
+        result = Event.objects.free_busy(
+            [self.calendar, self.other], self.start, self.end, min_free=timedelta(hours=2),
+        )
+        self.assertEqual(result['busy'], [(make_aware(datetime(2024, 9, 1, 10, 0)), make_aware(datetime(2024, 9, 1, 12, 0)))])
+        self.assertEqual(result['free'], [
+            (self.start, make_aware(datetime(2024, 9, 1, 10, 0))),
+            (make_aware(datetime(2024, 9, 1, 12, 0)), self.end),
+        ])
+
+    def test_free_busy_b(self):
+        result = Event.objects.free_busy([self.calendar, self.other], self.start, self.end, tentative=False)
+        self.assertEqual(result['busy'], [(make_aware(datetime(2024, 9, 1, 10, 0)), make_aware(datetime(2024, 9, 1, 11, 0)))])
+        self.assertIsNone(result['free'])
+
+    def test_free_busy_c(self):
+        tokyo = ZoneInfo('Asia/Tokyo')
+        event = Event.objects.create(
+            calendar=self.other,
+            summary='FreeBusyTestCase1',
+            dtstart=datetime(2024, 9, 2, 0, 30, tzinfo=tokyo),
+            dtend=datetime(2024, 9, 2, 1, 0, tzinfo=tokyo),
+            tzid='Asia/Tokyo',
+        )
+        result = Event.objects.free_busy([self.other], make_aware(datetime(2024, 9, 1, 12, 0)), self.end)
+        self.assertIn((event.dtstart, event.dtend), result['busy'])
+
+        daily = Event.objects.create(
+            calendar=self.calendar,
+            summary='FreeBusyTestCase2',
+            dtstart=make_aware(datetime(2024, 9, 1, 22, 0)),
+            dtend=make_aware(datetime(2024, 9, 1, 23, 0)),
+        )
+        RecurrencyRule.objects.create_by_rrule(daily, 'FREQ=DAILY')
+        end = make_aware(datetime(2024, 9, 2, 23, 59))
+        result = Event.objects.free_busy([self.calendar], make_aware(datetime(2024, 9, 2, 8, 0)), end)
+        self.assertEqual(result['busy'], [(make_aware(datetime(2024, 9, 2, 22, 0)), make_aware(datetime(2024, 9, 2, 23, 0)))])
+
+    def test_free_busy_d(self):
+        Event.objects.create(
+            calendar=self.other,
+            summary='FreeBusyTestCase3',
+            dtstart=make_aware(datetime(2024, 9, 1, 9, 0)),
+            dtend=make_aware(datetime(2024, 9, 6, 18, 0)),
+        )
+        start, end = make_aware(datetime(2024, 9, 4, 8, 0)), make_aware(datetime(2024, 9, 4, 18, 0))
+        result = Event.objects.free_busy([self.other], start, end, min_free=timedelta(minutes=30))
+        self.assertEqual(result, {'busy': [(start, end)], 'free': []})
 
 
 class RecurrencyRuleManagerTestCase(CalendarTestCase):
@@ -154,6 +516,41 @@ class RecurrencyRuleManagerTestCase(CalendarTestCase):
         recurrency = RecurrencyRule.objects.create_by_rrule(self.event, rrule)
         self.assertEqual(str(recurrency), 'EventManagerTestCase')
 
+    def test_get_rule_string_a(self):
+        rrule = 'FREQ=DAILY;INTERVAL=2'
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, rrule)
+        self.assertEqual(recurrency.get_rule_string(), 'RRULE:FREQ=DAILY;INTERVAL=2')
+
+    def test_get_rule_string_b(self):
+        recurrency = RecurrencyRule.objects.build_by_rrule(self.event, 'FREQ=MONTHLY;BYMONTHDAY=15,28')
+        self.assertEqual(recurrency.get_rule_string(), 'RRULE:FREQ=MONTHLY;INTERVAL=1;BYMONTHDAY=15,28')
+
+    def test_get_rule_string_c(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=YEARLY')
+        self.assertEqual(recurrency.get_rule_string(), 'RRULE:FREQ=YEARLY;INTERVAL=1')
+        recurrency.delete()
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=YEARLY;BYMONTHDAY=7')
+        self.assertEqual(recurrency.get_rule_string(), 'RRULE:FREQ=YEARLY;INTERVAL=1;BYMONTHDAY=7')
+        self.assertIn(self.event.id, [i[0] for i in self.calendar.event_list_by_date(date(2024, 9, 7))])
+
+    def test_create_by_rrule_bulk_a(self):
+        event = Event.objects.create(
+            calendar=self.calendar,
+            summary='EventManagerTestCase1',
+            dtstart=self.start_time,
+            dtend=self.end_time,
+        )
+        created, rejected = RecurrencyRule.objects.create_by_rrule_bulk([
+            (self.event, 'FREQ=DAILY;INTERVAL=2'),
+            (event, 'FREQ=DAILY;INTERVAL'),
+            (event, 'FREQ=DAILY;COUNT='),
+        ])
+        self.assertEqual([rule.event for rule in created], [self.event])
+        self.assertEqual(
+            [(i[0], i[1]) for i in rejected], [(event, 'FREQ=DAILY;INTERVAL'), (event, 'FREQ=DAILY;COUNT=')],
+        )
+        self.assertEqual(RecurrencyRule.objects.get(event=self.event).interval, 2)
+
     def test_create_by_rrule_a(self):
         rrule = 'FREQ=DAILY;INTERVAL=2'
         recurrency = RecurrencyRule.objects.create_by_rrule(self.event, rrule)
@@ -199,3 +596,637 @@ class RecurrencyRuleManagerTestCase(CalendarTestCase):
         self.assertEqual(recurrency.interval, 10)
         self.assertEqual(recurrency.bymonth, '12')
         self.assertEqual(recurrency.bymonthdate, '7')
+
+
+class RecurrencyRuleTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dtstart = datetime(2024, 9, 1, 13, 0, tzinfo=timezone.utc)
+
+    def test_update_spec_a(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,WE;COUNT=5')
+        self.assertEqual(recurrency.rule_text, 'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,WE;COUNT=5')
+        self.assertEqual(recurrency.first_occurrence, self.dtstart)
+        self.assertEqual(recurrency.last_occurrence, datetime(2024, 9, 29, 13, 0, tzinfo=timezone.utc))
+
+    def test_update_spec_b(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=29')
+        self.assertEqual(recurrency.first_occurrence, datetime(2028, 2, 29, 13, 0, tzinfo=timezone.utc))
+        self.assertIsNone(recurrency.last_occurrence)
+
+    def test_update_spec_c(self):
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=2;UNTIL=20240910T120000Z')
+        self.event.dtstart = datetime(2024, 9, 2, 13, 0, tzinfo=timezone.utc)
+        self.event.save()
+        recurrency = RecurrencyRule.objects.get(event=self.event)
+        self.assertEqual(recurrency.first_occurrence, datetime(2024, 9, 2, 13, 0, tzinfo=timezone.utc))
+        self.assertEqual(recurrency.last_occurrence, datetime(2024, 9, 10, 13, 0, tzinfo=timezone.utc))
+
+    def test_get_last_date_a(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,WE;COUNT=5')
+        self.assertEqual(recurrency.get_last_date(self.dtstart), date(2024, 9, 29))
+
+    def test_get_last_date_b(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;UNTIL=20240910T120000Z')
+        self.assertEqual(recurrency.get_last_date(self.dtstart), date(2024, 9, 9))
+
+    def test_has_date_a(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=3;COUNT=4')
+        self.assertTrue(recurrency.has_date(self.dtstart, date(2024, 9, 10)))
+        self.assertFalse(recurrency.has_date(self.dtstart, date(2024, 9, 11)))
+        self.assertFalse(recurrency.has_date(self.dtstart, date(2024, 9, 13)))
+
+    def test_has_date_b(self):
+        recurrency = RecurrencyRule.objects.get(
+            pk=RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=MONTHLY;BYDAY=1SA').pk,
+        )
+        self.assertTrue(recurrency.has_date(self.dtstart, date(2024, 10, 5)))
+        self.assertFalse(recurrency.has_date(self.dtstart, date(2024, 10, 12)))
+
+    def test_iter_dates_a(self):
+        recurrency = RecurrencyRule.objects.get(
+            pk=RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR').pk,
+        )
+        self.assertEqual(list(recurrency.iter_dates(self.dtstart, date(2024, 9, 10), date(2024, 9, 30))), [
+            date(2024, 9, 13), date(2024, 9, 23), date(2024, 9, 27),
+        ])
+        self.assertEqual(
+            list(recurrency.iter_dates(self.dtstart, date(2024, 9, 10), date(2024, 9, 30))),
+            [d.date() for d in recurrency.get_datetimes(self.dtstart).between(
+                datetime(2024, 9, 10, tzinfo=timezone.utc), datetime(2024, 9, 30, 23, tzinfo=timezone.utc),
+            )],
+        )
+
+
+class RuleCacheTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rule_cache.clear()
+
+    def test_get_datetimes_a(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=2')
+        dtstart = datetime(2024, 9, 1, tzinfo=timezone.utc)
+        self.assertIs(recurrency.get_datetimes(dtstart), recurrency.get_datetimes(dtstart))
+        self.assertEqual(rule_cache.info()['hits'], 1)
+        self.assertEqual(rule_cache.info()['misses'], 1)
+
+    def test_get_datetimes_b(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=2')
+        dtstart = datetime(2024, 9, 1, tzinfo=timezone.utc)
+        recurrency.get_datetimes(dtstart)
+        recurrency.interval = 3
+        recurrency.save()
+        self.assertEqual(rule_cache.info()['size'], 0)
+        self.assertNotIn(datetime(2024, 9, 3, tzinfo=timezone.utc), recurrency.get_datetimes(dtstart))
+
+    def test_maxsize_a(self):
+        cache = RuleCache(maxsize=2)
+        for key in range(3):
+            cache.get((key, ''), object)
+        cache.get((0, ''), object)
+        self.assertEqual(cache.info(), {'hits': 0, 'misses': 4, 'size': 2, 'maxsize': 2})
+
+    @override_settings(CALENDAR_RULE_CACHE_SIZE=0)
+    def test_maxsize_b(self):
+        recurrency = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=2')
+        recurrency.get_datetimes(datetime(2024, 9, 1, tzinfo=timezone.utc))
+        self.assertEqual(rule_cache.info()['size'], 0)
+
+
+@override_settings(CALENDAR_RESULT_CACHE='default')
+class ResultCacheTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.calendar.refresh_from_db()
+
+    def test_bump_version_a(self):
+        version = self.calendar.version
+        rule = RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=1')
+        ExDate.objects.create(event=self.event, exdate=self.start_time)
+        rule.delete()
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.version, version + 3)
+
+    def test_list_by_range_a(self):
+        expected = self.calendar.event_list_by_range(date(2024, 8, 31), date(2024, 9, 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.calendar.event_list_by_range(date(2024, 8, 31), date(2024, 9, 2)), expected)
+        with self.assertNumQueries(0):
+            self.calendar.event_list_by_range(date(2024, 8, 31), date(2024, 9, 2), version=self.calendar.version)
+
+    def test_list_by_range_b(self):
+        self.calendar.event_list_by_date(date(2024, 9, 1))
+        self.event.summary = 'ResultCacheTestCase'
+        self.event.save()
+        self.assertEqual(self.calendar.event_list_by_date(date(2024, 9, 1))[0][1]['summary'], 'ResultCacheTestCase')
+
+    def test_list_by_range_c(self):
+        other = Calendar.objects.create(summary='ResultCacheTestCase1')
+        self.calendar.event_list_by_date(date(2024, 9, 1))
+        self.event.calendar = other
+        self.event.save()
+        self.assertEqual(self.calendar.event_list_by_date(date(2024, 9, 1)), [])
+        self.assertEqual([i[0] for i in other.event_list_by_date(date(2024, 9, 1))], [self.event.id])
+
+    def test_list_by_range_d(self):
+        self.calendar.event_list_by_date(date(2024, 9, 1))
+        self.calendar.tzid = 'Asia/Tokyo'
+        self.calendar.save()
+        obj = self.calendar.event_list_by_date(date(2024, 9, 1))[0][1]
+        self.assertEqual((obj.dtstart.tzinfo, obj.dtstart.hour), (ZoneInfo('Asia/Tokyo'), 22))
+
+    def test_invalidate_a(self):
+        self.calendar.event_list_by_date(date(2024, 9, 1))
+        self.assertEqual(len(cache.get(result_cache.get_index_key(self.calendar.pk))), 1)
+        ExDate.objects.create(event=self.event, exdate=self.start_time)
+        self.assertIsNone(cache.get(result_cache.get_index_key(self.calendar.pk)))
+
+    @override_settings(CALENDAR_RESULT_CACHE_MAX_WINDOWS=2)
+    def test_invalidate_b(self):
+        for day in range(1, 4):
+            self.calendar.event_list_by_date(date(2024, 9, day))
+        windows = cache.get(result_cache.get_index_key(self.calendar.pk))
+        self.assertEqual(len(windows), 2)
+        first = result_cache.make_key((self.calendar.pk, self.calendar.version, date(2024, 9, 1), date(2024, 9, 1)))
+        self.assertNotIn(first, windows)
+        self.assertIsNone(cache.get(first))
+        self.assertTrue(all(cache.get(window) is not None for window in windows))
+
+    def test_stampede_a(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.2)
+            return {}
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda i: result_cache.get(('stampede', 0), factory), range(4)))
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [{}] * 4)
+
+    def test_stampede_b(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.2)
+            if len(calls) == 1:
+                raise ValueError
+            return {}
+
+        def get(i):
+            try:
+                return result_cache.get(('stampede', 1), factory)
+            except ValueError as error:
+                return error
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(get, range(4)))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(len([result for result in results if result == {}]), 3)
+
+
+class AsyncListingTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=WEEKLY;BYDAY=SU,WE')
+        ExDate.objects.create(event=self.event, exdate=make_aware(datetime(2024, 9, 8, 10, 0)))
+        self.other = Calendar.objects.create(summary='AsyncListingTestCase')
+        Event.objects.create(
+            calendar=self.other,
+            summary='AsyncListingTestCase',
+            dtstart=make_aware(datetime(2024, 9, 5, 9, 0)),
+            dtend=make_aware(datetime(2024, 9, 5, 10, 0)),
+        )
+
+    def test_alist_by_range_a(self):
+        result = async_to_sync(Event.objects.alist_by_range)(self.calendar, date(2024, 9, 1), date(2024, 9, 30))
+        self.assertEqual(result, Event.objects.list_by_range(self.calendar, date(2024, 9, 1), date(2024, 9, 30)))
+        self.assertNotIn(date(2024, 9, 8), result)
+
+    @override_settings(CALENDAR_RESULT_CACHE='default')
+    def test_alist_by_date_a(self):
+        cache.clear()
+        result = async_to_sync(Event.objects.alist_by_date)(date(2024, 9, 4), self.calendar)
+        self.assertEqual(result, self.calendar.event_list_by_date(date(2024, 9, 4)))
+        self.calendar.refresh_from_db()
+        with self.assertNumQueries(0):
+            async_to_sync(Event.objects.alist_by_date)(date(2024, 9, 4), self.calendar, self.calendar.version)
+
+    def test_aupcoming_a(self):
+        after = make_aware(datetime(2024, 9, 2))
+        with self.assertNumQueries(3):
+            result = async_to_sync(Event.objects.aupcoming)([self.calendar, self.other], after, limit=4)
+        self.assertEqual(result, Event.objects.upcoming([self.calendar, self.other], after, limit=4))
+        self.assertEqual([obj['summary'] for data, event_id, obj in result], [
+            'EventManagerTestCase', 'AsyncListingTestCase', 'EventManagerTestCase', 'EventManagerTestCase',
+        ])
+
+
+class TimezoneTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.new_york = Calendar.objects.create(summary='TimezoneTestCase', tzid='America/New_York')
+        self.weekly = Event.objects.create(
+            calendar=self.new_york,
+            summary='TimezoneTestCase',
+            dtstart=datetime(2024, 10, 28, 9, 0, tzinfo=ZoneInfo('America/New_York')),
+            dtend=datetime(2024, 10, 28, 10, 0, tzinfo=ZoneInfo('America/New_York')),
+        )
+        RecurrencyRule.objects.create_by_rrule(self.weekly, 'FREQ=WEEKLY;BYDAY=MO;COUNT=3')
+
+    def test_list_by_range_a(self):
+        result = self.new_york.event_list_by_range(date(2024, 10, 27), date(2024, 11, 12))
+        self.assertEqual(list(result), [date(2024, 10, 28), date(2024, 11, 4), date(2024, 11, 11)])
+        occurrences = [obj for events in result.values() for event_id, obj in events]
+        self.assertEqual([obj.dtstart.hour for obj in occurrences], [9, 9, 9])
+        self.assertEqual(
+            [obj.dtstart.astimezone(timezone.utc).hour for obj in occurrences], [13, 14, 14],
+        )
+        self.assertEqual(RecurrencyRule.objects.get(event=self.weekly).last_occurrence, occurrences[-1].dtstart)
+
+    def test_list_by_range_b(self):
+        tokyo = Event.objects.create(
+            calendar=self.calendar,
+            summary='TimezoneTestCase1',
+            dtstart=datetime(2024, 9, 2, 8, 0, tzinfo=ZoneInfo('Asia/Tokyo')),
+            dtend=datetime(2024, 9, 2, 9, 0, tzinfo=ZoneInfo('Asia/Tokyo')),
+            tzid='Asia/Tokyo',
+        )
+        result = self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 9, 2))
+        self.assertEqual([event_id for event_id, obj in result[date(2024, 9, 2)]], [tokyo.id])
+        result = self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 9, 2), tzinfo=ZoneInfo('UTC'))
+        self.assertEqual([event_id for event_id, obj in result[date(2024, 9, 1)]], [self.event.id, tokyo.id])
+        self.assertEqual(result[date(2024, 9, 1)][1][1].dtstart.tzinfo, ZoneInfo('UTC'))
+
+    def test_list_by_date_a(self):
+        result = Event.objects.list_by_date(date(2024, 11, 4), self.new_york, tzinfo=ZoneInfo('Asia/Tokyo'))
+        self.assertEqual([localtime(obj.dtstart, ZoneInfo('Asia/Tokyo')).hour for event_id, obj in result], [23])
+
+    @override_settings(CALENDAR_OCCURRENCES=True)
+    def test_materialize_calendar_a(self):
+        expected = self.new_york.event_list_by_range(date(2024, 10, 27), date(2024, 11, 12))
+        materialize_calendar(self.new_york, date(2024, 11, 12), start=date(2024, 10, 27))
+        result = self.new_york.event_list_by_range(date(2024, 10, 27), date(2024, 11, 12))
+        self.assertEqual(
+            [(obj.dtstart.tzinfo, obj.dtstart.hour) for events in result.values() for event_id, obj in events],
+            [(obj.dtstart.tzinfo, obj.dtstart.hour) for events in expected.values() for event_id, obj in events],
+        )
+
+    def test_validate_tzid_a(self):
+        self.new_york.tzid = 'Mars/Olympus_Mons'
+        with self.assertRaises(ValidationError):
+            self.new_york.full_clean()
+
+
+class InstrumentationTestCase(CalendarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rule_cache.clear()
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=MONTHLY;BYMONTHDAY=1')
+        self.spans = []
+        span_finished.connect(self.receive)
+        self.addCleanup(span_finished.disconnect, self.receive)
+
+    def receive(self, sender, span, **kwargs):
+        self.spans.append(span.as_dict())
+
+    @override_settings(CALENDAR_INSTRUMENTATION=True)
+    def test_span_a(self):
+        self.calendar.event_list_by_date(date(2024, 10, 1))
+        self.calendar.event_list_by_date(date(2024, 10, 1))
+        self.assertEqual([span['name'] for span in self.spans], ['list_by_date', 'list_by_date'])
+        self.assertEqual(self.spans[0]['queries'], 3)
+        self.assertEqual(self.spans[0]['counters'], {'events': 1, 'rules_parsed': 1, 'occurrences': 1})
+        self.assertEqual(self.spans[1]['counters'], {'events': 1, 'rule_cache_hits': 1, 'occurrences': 1})
+        self.assertEqual(set(self.spans[0]['phases']), {'sql', 'parse', 'expand'})
+
+    @override_settings(CALENDAR_INSTRUMENTATION_CALLBACK='tests.test_calendar.record_span')
+    def test_span_b(self):
+        SPANS.clear()
+        Event.objects.upcoming([self.calendar], after=make_aware(datetime(2024, 9, 2)), limit=2)
+        self.assertEqual([span['name'] for span in SPANS], ['upcoming'])
+        self.assertEqual(SPANS[0]['counters']['occurrences'], 2)
+
+    def test_span_c(self):
+        self.calendar.event_list_by_date(date(2024, 10, 1))
+        self.assertEqual(self.spans, [])
+
+
+@override_settings(CALENDAR_OCCURRENCES=True)
+class OccurrenceTestCase(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(summary='OccurrenceTestCase')
+        self.today = localdate()
+        self.event = Event.objects.create(
+            calendar=self.calendar,
+            summary='OccurrenceTestCase',
+            dtstart=make_aware(datetime(self.today.year, self.today.month, self.today.day, 10, 0)),
+            dtend=make_aware(datetime(self.today.year, self.today.month, self.today.day, 11, 0)),
+        )
+        RecurrencyRule.objects.create_by_rrule(self.event, 'FREQ=DAILY;INTERVAL=2')
+        self.single = Event.objects.create(
+            calendar=self.calendar,
+            summary='OccurrenceTestCase1',
+            dtstart=make_aware(datetime(self.today.year, self.today.month, self.today.day, 8, 0)),
+            dtend=make_aware(datetime(self.today.year, self.today.month, self.today.day, 9, 0)),
+        )
+
+    def test_materialize_calendar_a(self):
+        end = self.today + timedelta(days=30)
+        expected = self.calendar.event_list_by_range(self.today, end)
+        self.assertEqual(materialize_calendar(self.calendar, end), 17)
+        self.assertEqual(self.calendar.occurrences_start, self.today)
+        self.assertEqual(self.calendar.occurrences_end, end)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.calendar.event_list_by_range(self.today, end), expected)
+        with self.assertNumQueries(1):
+            result = Event.objects.list_by_calendars([self.calendar], self.today, end)
+        self.assertEqual(result, {self.calendar.uid: expected})
+        self.assertEqual(
+            self.calendar.event_list_by_date(self.today),
+            [(self.single.id, expected[self.today][0][1]), (self.event.id, expected[self.today][1][1])],
+        )
+
+    def test_materialize_calendar_b(self):
+        materialize_calendar(self.calendar, self.today + timedelta(days=10))
+        self.assertEqual(materialize_calendar(self.calendar, self.today + timedelta(days=20)), 5)
+        self.assertEqual(Occurrence.objects.filter(event=self.event).count(), 11)
+
+    def test_materialize_calendar_c(self):
+        materialize_calendar(self.calendar, self.today + timedelta(days=10))
+        start = self.today + timedelta(days=4)
+        self.assertEqual(materialize_calendar(self.calendar, self.today + timedelta(days=14), start=start), 2)
+        self.assertEqual(self.calendar.occurrences_start, start)
+        self.assertEqual(
+            list(Occurrence.objects.filter(calendar=self.calendar).order_by('day').values_list('day', flat=True)),
+            [start + timedelta(days=day) for day in range(0, 11, 2)],
+        )
+        self.assertEqual(materialize_calendar(self.calendar, self.today + timedelta(days=14)), 0)
+        self.assertEqual(self.calendar.occurrences_start, start)
+
+    def test_materialize_calendar_d(self):
+        weekday = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU'][self.today.weekday()]
+        event = Event.objects.create(
+            calendar=self.calendar,
+            summary='OccurrenceTestCase2',
+            dtstart=make_aware(datetime(self.today.year, self.today.month, self.today.day, 12, 30)),
+            dtend=make_aware(datetime(self.today.year, self.today.month, self.today.day, 13, 30)),
+        )
+        RecurrencyRule.objects.create_by_rrule(event, 'FREQ=WEEKLY;BYDAY={};COUNT=2'.format(weekday))
+        materialize_calendar(self.calendar, self.today + timedelta(days=20))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.calendar.tzid = 'Asia/Tokyo'
+            self.calendar.save()
+        tokyo = ZoneInfo('Asia/Tokyo')
+        expected = [self.today + timedelta(days=7), self.today + timedelta(days=14)]
+        self.assertEqual(
+            list(Occurrence.objects.filter(event=event).order_by('day').values_list('day', flat=True)), expected,
+        )
+        last = RecurrencyRule.objects.get(event=event).last_occurrence
+        self.assertEqual((last.astimezone(tokyo).date(), last.astimezone(tokyo).hour), (expected[-1], 0))
+
+    def test_materialize_event_a(self):
+        materialize_calendar(self.calendar, self.today + timedelta(days=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = RecurrencyRule.objects.get(event=self.event)
+            rule.interval = 1
+            rule.save()
+        self.assertEqual(Occurrence.objects.filter(event=self.event).count(), 11)
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+        self.assertEqual(Occurrence.objects.filter(event=self.event).count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        self.assertEqual(Occurrence.objects.count(), 1)
+
+    def test_materialize_event_b(self):
+        materialize_calendar(self.calendar, self.today + timedelta(days=10))
+        other = Calendar.objects.create(summary='OccurrenceTestCase2')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.calendar = other
+            self.event.save()
+        self.assertEqual(Occurrence.objects.filter(event=self.event).count(), 0)
+        self.assertNotIn(self.event.id, [
+            event_id for event_id, obj in self.calendar.event_list_by_date(self.today)
+        ])
+
+    def test_command_a(self):
+        call_command('materialize_occurrences', horizon=10, stdout=StringIO())
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.occurrences_end, self.today + timedelta(days=10))
+        self.assertEqual(Occurrence.objects.filter(calendar=self.calendar).count(), 7)
+
+
+class ImportEventsTestCase(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(summary='ImportEventsTestCase')
+
+    def test_import_events_a(self):
+        rows = [
+            {
+                'summary': 'ImportEventsTestCase{}'.format(day),
+                'dtstart': datetime(2024, 9, day, 13, 0, tzinfo=timezone.utc),
+                'dtend': datetime(2024, 9, day, 14, 0, tzinfo=timezone.utc),
+                'rrule': 'FREQ=WEEKLY;BYDAY=MO' if day % 2 else None,
+                'exdate': [datetime(2024, 9, 16, 13, 0, tzinfo=timezone.utc)] if day == 1 else [],
+            }
+            for day in range(1, 8)
+        ]
+        rows.insert(3, {'summary': 'ImportEventsTestCase', 'dtstart': None, 'dtend': None})
+        rows.insert(5, {
+            'summary': 'ImportEventsTestCase',
+            'dtstart': datetime(2024, 9, 1, 13, 0, tzinfo=timezone.utc),
+            'dtend': datetime(2024, 9, 1, 14, 0, tzinfo=timezone.utc),
+            'rrule': 'INTERVAL=1',
+        })
+        created, rejected = import_events(self.calendar, rows, batch_size=3)
+        self.assertEqual(len(created), 7)
+        self.assertEqual([i[0] for i in rejected], [3, 5])
+        self.assertEqual(RecurrencyRule.objects.filter(event__calendar=self.calendar).count(), 4)
+        self.assertEqual(ExDate.objects.filter(event__calendar=self.calendar).count(), 1)
+        self.assertEqual(len(self.calendar.event_list_by_date(datetime(2024, 9, 16))), 3)
+
+    @override_settings(CALENDAR_OCCURRENCES=True)
+    def test_import_events_b(self):
+        today = localdate()
+        materialize_calendar(self.calendar, today + timedelta(days=13))
+        created, rejected = import_events(self.calendar, [{
+            'summary': 'ImportEventsTestCase',
+            'dtstart': make_aware(datetime(today.year, today.month, today.day, 10, 0)),
+            'dtend': make_aware(datetime(today.year, today.month, today.day, 11, 0)),
+            'rrule': 'FREQ=DAILY;INTERVAL=1',
+        }])
+        self.assertEqual(Occurrence.objects.filter(event=created[0]).count(), 14)
+
+
+ICS = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//ImportIcsTestCase//EN
+BEGIN:VEVENT
+UID:weekly@example.com
+DTSTART;TZID=America/Sao_Paulo:20240902T100000
+DTEND;TZID=America/Sao_Paulo:20240902T110000
+SUMMARY:Reunião\\, semanal
+DESCRIPTION:Linha 1\\nLinha 2 com uma descrição longa que foi dobrada pelo
+  servidor de origem
+RRULE:FREQ=WEEKLY;INTERVAL=1;BYDAY=MO
+EXDATE:20240909T130000Z,20240916T130000Z
+SEQUENCE:1
+BEGIN:VALARM
+ACTION:DISPLAY
+SUMMARY:Alarme
+END:VALARM
+END:VEVENT
+BEGIN:VEVENT
+UID:single@example.com
+DTSTART;VALUE=DATE:20240905
+SUMMARY:Dia inteiro
+STATUS:TENTATIVE
+END:VEVENT
+BEGIN:VEVENT
+UID:weekly@example.com
+RECURRENCE-ID:20240923T130000Z
+DTSTART:20240923T150000Z
+SUMMARY:Exceção
+END:VEVENT
+BEGIN:VEVENT
+UID:invalid@example.com
+SUMMARY:Sem data
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class ImportIcsTestCase(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(summary='ImportIcsTestCase')
+
+    def test_iter_vevents_a(self):
+        vevents = list(iter_vevents(StringIO(ICS)))
+        self.assertEqual(len(vevents), 4)
+        self.assertNotIn('ACTION', vevents[0])
+        self.assertEqual(vevents[0]['SUMMARY'], [({}, 'Reunião\\, semanal')])
+        self.assertEqual(vevents[0]['DTSTART'], [({'TZID': 'America/Sao_Paulo'}, '20240902T100000')])
+
+    def test_iter_vevents_b(self):
+        ics = ICS.replace('PRODID', 'LINHA INVÁLIDA\nPRODID').replace('STATUS:TENTATIVE', 'STATUS TENTATIVE')
+        result = import_ics(self.calendar, StringIO(ics))
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([i[0] for i in result['rejected']], [1, 2, 3])
+
+    def test_import_ics_a(self):
+        result = import_ics(self.calendar, StringIO(ICS))
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([i[0] for i in result['rejected']], [2, 3])
+
+        event = Event.objects.get(calendar=self.calendar, uid=uuid5(NAMESPACE_URL, 'weekly@example.com'))
+        self.assertEqual(event.summary, 'Reunião, semanal')
+        self.assertTrue(event.description.startswith('Linha 1\nLinha 2'))
+        self.assertTrue(event.description.endswith('dobrada pelo servidor de origem'))
+        self.assertEqual(event.dtstart, datetime(2024, 9, 2, 13, 0, tzinfo=timezone.utc))
+        self.assertEqual(event.tzid, 'America/Sao_Paulo')
+        self.assertEqual(event.rrule.freq, 'WEEKLY')
+        self.assertEqual(event.exdate.count(), 2)
+        dias = self.calendar.event_list_by_range(date(2024, 9, 1), date(2024, 9, 30))
+        self.assertEqual(list(dias), [date(2024, 9, 2), date(2024, 9, 5), date(2024, 9, 23), date(2024, 9, 30)])
+        self.assertEqual(dias[date(2024, 9, 5)][0][1]['status'], 'TENTATIVE')
+
+    def test_import_ics_b(self):
+        import_ics(self.calendar, StringIO(ICS))
+        result = import_ics(self.calendar, StringIO(ICS))
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (0, 0, 2))
+
+        changed = ICS.replace('SEQUENCE:1', 'SEQUENCE:2').replace('BYDAY=MO', 'BYDAY=TU')
+        result = import_ics(self.calendar, StringIO(changed), batch_size=1)
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (0, 1, 1))
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 2)
+        event = Event.objects.get(calendar=self.calendar, uid=uuid5(NAMESPACE_URL, 'weekly@example.com'))
+        self.assertEqual(event.sequence, 2)
+        self.assertEqual(event.rrule.byday, ['TU'])
+
+        invalid = ICS.replace('SEQUENCE:1', 'SEQUENCE:3').replace('FREQ=WEEKLY;INTERVAL=1;BYDAY=MO', 'BYDAY=MO')
+        result = import_ics(self.calendar, StringIO(invalid))
+        self.assertEqual(result['updated'], 0)
+        self.assertEqual(sorted(i[0] for i in result['rejected']), [0, 2, 3])
+        self.assertEqual(Event.objects.get(pk=event.pk).sequence, 2)
+
+    @override_settings(CALENDAR_OCCURRENCES=True)
+    def test_import_ics_d(self):
+        import_ics(self.calendar, StringIO(ICS))
+        changed = ICS.replace('SEQUENCE:1', 'SEQUENCE:2').replace('BYDAY=MO', 'BYDAY=TU')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(import_ics(self.calendar, StringIO(changed))['updated'], 1)
+        versions = [query for query in queries if query['sql'].startswith('UPDATE "calendar_calendar"')]
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(ExDate.objects.filter(event__calendar=self.calendar).count(), 2)
+
+    def test_command_a(self):
+        with NamedTemporaryFile('w', suffix='.ics', encoding='utf-8') as ics:
+            ics.write(ICS)
+            ics.flush()
+            stdout = StringIO()
+            call_command('import_ics', str(self.calendar.uid), ics.name, stdout=stdout, stderr=StringIO())
+        self.assertIn('2 criados', stdout.getvalue())
+
+    def test_import_ics_c(self):
+        ics = ICS.replace('America/Sao_Paulo:20240902', 'America/New_York:20241028').replace('EXDATE', 'X-EXDATE')
+        import_ics(self.calendar, StringIO(ics))
+        dias = self.calendar.event_list_by_range(date(2024, 10, 28), date(2024, 11, 4))
+        occurrences = [obj for events in dias.values() for event_id, obj in events if obj['summary'] != 'Dia inteiro']
+        self.assertEqual([obj.dtstart.hour for obj in occurrences], [10, 10])
+        self.assertEqual([obj.dtstart.utcoffset() for obj in occurrences], [timedelta(hours=-4), timedelta(hours=-5)])
+
+
+class ExportIcsTestCase(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(summary='ExportIcsTestCase')
+        import_ics(self.calendar, StringIO(ICS))
+
+    def test_iter_ics_a(self):
+        ics = ''.join(iter_ics(self.calendar, chunk_size=1))
+        self.assertTrue(ics.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=1;BYDAY=MO\r\n', ics)
+        self.assertIn('DTSTART;TZID=America/Sao_Paulo:20240902T100000\r\n', ics)
+        self.assertIn('EXDATE;TZID=America/Sao_Paulo:20240909T100000,20240916T100000\r\n', ics)
+        self.assertIn('DTSTART:20240905T030000Z\r\n', ics)
+        self.assertIn('SUMMARY:Reunião\\, semanal\r\n', ics)
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in ics.split('\r\n')))
+
+    def test_iter_ics_b(self):
+        other = Calendar.objects.create(summary='ExportIcsTestCase1')
+        import_ics(other, StringIO(''.join(iter_ics(self.calendar))))
+
+        def as_dicts(calendar):
+            dias = calendar.event_list_by_range(date(2024, 9, 1), date(2024, 12, 31))
+            return {data: [dict(i[1]) for i in events] for data, events in dias.items()}
+
+        self.assertEqual(as_dicts(other), as_dicts(self.calendar))
+
+    def test_calendar_feed_a(self):
+        url = reverse('calendar:feed', args=[self.calendar.uid])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn(b'BEGIN:VEVENT', b''.join(response.streaming_content))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Event.objects.filter(calendar=self.calendar).first().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_calendar_feed_b(self):
+        self.assertEqual(self.client.get(reverse('calendar:feed', args=[uuid4()])).status_code, 404)
@@ -0,0 +1,6 @@
+from django.urls import include, path
+
+
+urlpatterns = [
+    path('calendar/', include('django_calendar.urls')),
+]